@@ -1,35 +1,81 @@
 from fastapi import APIRouter, Request, HTTPException
-from app.core.telegram_bot import create_app, process_webhook_update
+from app.core.bot_queue import process_recorded, record_update, recover_inline, recover_pending, recovery_due, update_queue
+from app.core.config import settings
+from app.core.telegram_bot import create_app
+import asyncio
+import hmac
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Lazy load the bot app only when needed (for serverless efficiency)
+# Lazy load the bot app only when needed (for serverless efficiency); kept for warm invocations
 bot_app = None
+_bot_app_lock = asyncio.Lock()
+
+async def get_bot_app():
+    """The initialized bot app of this process, created on first use (None if not configured)."""
+    global bot_app
+    # Initialize once, even if the first updates arrive together
+    if not bot_app:
+        async with _bot_app_lock:
+            if not bot_app:
+                application = create_app(webhook=True)
+                if not application:
+                    return None
+
+                # Initialize the application (getMe is served from the database after the first start)
+                await application.initialize()
+                bot_app = application
+                if settings.BOT_WEBHOOK_ASYNC and recovery_due():
+                    recovered = recover_pending(bot_app)
+                    if recovered:
+                        logger.info("Re-queued %s unfinished Telegram updates", recovered)
+    return bot_app
 
 @router.post("/webhook/telegram")
 async def telegram_webhook(request: Request):
     """
     Handle incoming Telegram updates via Webhook.
+    The update is stored and acknowledged right away; a retried update_id is ignored.
     """
-    global bot_app
-    
+    # Telegram echoes the secret_token given to setWebhook in this header
+    if settings.TELEGRAM_WEBHOOK_SECRET:
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(token, settings.TELEGRAM_WEBHOOK_SECRET):
+            raise HTTPException(status_code=403, detail="Invalid secret token")
+
     try:
         data = await request.json()
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid JSON")
+    update_id = data.get("update_id") if isinstance(data, dict) else None
+    if not isinstance(update_id, int):
+        raise HTTPException(status_code=400, detail="Missing update_id")
 
-    # Initialize Bot App if not ready
-    if not bot_app:
-        bot_app = create_app()
-        if not bot_app:
-            raise HTTPException(status_code=500, detail="Bot configuration failed")
-        
-        # Initialize the application (connects to bot API, etc.)
-        await bot_app.initialize()
-
-    # Process the update
-    await process_webhook_update(bot_app, data)
-    
-    return {"status": "ok"}
+    application = await get_bot_app()
+    if not application:
+        raise HTTPException(status_code=500, detail="Bot configuration failed")
+
+    recorded = record_update(update_id, data)
+
+    # Serverless platforms may freeze the process after the response, so they process inline.
+    # A warm instance can live for hours, so abandoned updates are also checked every few
+    # minutes here, not only on a cold start.
+    if not settings.BOT_WEBHOOK_ASYNC:
+        if recorded:
+            await process_recorded(application, update_id, data)
+        if recovery_due():
+            recovered = await recover_inline(application)
+            if recovered:
+                logger.info("Processed %s unfinished Telegram updates", recovered)
+        return {"status": "ok" if recorded else "duplicate"}
+
+    if recovery_due():
+        recovered = recover_pending(application)
+        if recovered:
+            logger.info("Re-queued %s unfinished Telegram updates", recovered)
+    if not recorded:
+        return {"status": "duplicate"}
+    update_queue.submit(application, update_id, data)
+    return {"status": "queued"}
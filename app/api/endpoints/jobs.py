@@ -1,10 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
 from typing import List
 from app.core.database import get_db
+from app.core.cache import invalidate_reports
+from app.core.dispatch import dispatchable_jobs, propose_dispatch, apply_dispatch
+from app.core.geo import parse_coords
+from app.core.routing import plan_route, technician_jobs_query
+from app.core.conflicts import find_conflicts_for, job_assignee_ids, scan_conflicts
+from app.core.visibility import scope_jobs, can_access_job, is_restricted
 from app.models.models import Job, JobType, JobStatus, User, Assignment, JobHistory
 from pydantic import BaseModel
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from typing import Optional, List
 
 router = APIRouter()
@@ -95,12 +102,78 @@ class AssignmentOut(BaseModel):
         
 JobOut.update_forward_refs()
 
+class DispatchRequest(BaseModel):
+    job_ids: Optional[List[int]] = None # default: every unassigned pending job in the date range
+    start: Optional[date] = None
+    end: Optional[date] = None
+    team_id: Optional[int] = None # only dispatch to this team's technicians
+    max_jobs_per_day: Optional[int] = None
+    apply: bool = False
+
+class DispatchProposal(BaseModel):
+    job_id: int
+    job_title: str
+    scheduled_date: date
+    technician_id: int
+    technician_name: Optional[str] = None
+    team_id: Optional[int] = None
+    distance_km: Optional[float] = None # from the technician's other jobs that day
+    cost: float
+    day_load: int
+
+class DispatchSkipped(BaseModel):
+    job_id: int
+    reason: str
+
+class DispatchOut(BaseModel):
+    proposals: List[DispatchProposal]
+    unassigned: List[DispatchSkipped]
+    applied: int = 0
+
+class ConflictOut(BaseModel):
+    technician_id: int
+    technician_name: Optional[str] = None
+    date: date
+    job_id: Optional[int] = None # None while the job is being created
+    job_title: Optional[str] = None
+    scheduled_time: Optional[str] = None
+    conflicting_job_id: int
+    conflicting_job_title: Optional[str] = None
+    conflicting_scheduled_time: Optional[str] = None
+
+def _check_conflicts(db: Session, technician_ids, day, scheduled_time, job_id=None, title=None):
+    conflicts = find_conflicts_for(db, technician_ids, day, scheduled_time, job_id=job_id, title=title)
+    if conflicts:
+        raise HTTPException(status_code=409, detail={
+            "message": "Technician already booked at this time",
+            "conflicts": jsonable_encoder(conflicts)
+        })
+
+class RouteStop(BaseModel):
+    job_id: int
+    title: str
+    scheduled_time: Optional[str] = None
+    location_lat: Optional[str] = None
+    location_long: Optional[str] = None
+    leg_km: float
+    arrival: str # estimated, HH:MM
+    late_minutes: int
+
+class RouteOut(BaseModel):
+    technician_id: int
+    date: date
+    distance_km: float
+    naive_distance_km: float # visiting the stops in scheduled order
+    stops: List[RouteStop]
+    unrouted: List[int] # jobs without coordinates
+
 from app.api.deps import get_current_user
 from app.models.models import UserRole
 
 @router.post("/", response_model=JobOut)
 def create_job(
     job: JobCreate, 
+    allow_conflicts: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -109,6 +182,8 @@ def create_job(
 
     job_data = job.dict()
     technician_ids = job_data.pop('technician_ids', [])
+    if technician_ids and not allow_conflicts:
+        _check_conflicts(db, technician_ids, job.scheduled_date, job.scheduled_time, title=job.title)
     
     db_job = Job(**job_data)
     db.add(db_job)
@@ -128,6 +203,7 @@ def create_job(
         db.commit()
         db.refresh(db_job)
         
+    invalidate_reports()
     return db_job
 
 from sqlalchemy import or_
@@ -151,20 +227,8 @@ def read_jobs(
     print(f"DEBUG: Read Jobs - User: {current_user.username}, Role: {current_user.role}, Search: {search}")
 
 
-    query = db.query(Job)
-    
-    # RBAC Filtering
-    # Robust check for role type (Enum vs String)
-    user_role_str = str(current_user.role.value if hasattr(current_user.role, 'value') else current_user.role).lower()
-    
-    if user_role_str == "technician":
-        query = query.join(Assignment).filter(
-            or_(
-                Assignment.technician_id == current_user.id,
-                Assignment.team_id == current_user.team_id if current_user.team_id else False
-            )
-        ).distinct()
-        print(f"DEBUG: Applied Technician Filter for user {current_user.id}")
+    # RBAC Filtering: technicians only see jobs assigned to them or their team
+    query = scope_jobs(db.query(Job), db, current_user)
         
     if project_id:
         query = query.filter(Job.project_id == project_id)
@@ -215,6 +279,70 @@ def read_jobs(
     print(f"DEBUG: Returning {len(jobs)} jobs")
     return jobs
 
+@router.post("/dispatch", response_model=DispatchOut)
+def dispatch_jobs(
+    request: DispatchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Propose (or, with apply=true, create) technician assignments for unassigned pending jobs."""
+    if current_user.role not in [UserRole.ADMIN, UserRole.STAFF]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    start = request.start or date.today()
+    end = request.end or start + timedelta(days=6)
+    jobs = dispatchable_jobs(db, start, end, request.job_ids)
+    result = propose_dispatch(db, jobs, team_id=request.team_id, max_per_day=request.max_jobs_per_day)
+
+    result["applied"] = 0
+    if request.apply and result["proposals"]:
+        result["applied"] = apply_dispatch(db, result["proposals"], user_id=current_user.id)
+        invalidate_reports()
+    return result
+
+@router.get("/conflicts", response_model=List[ConflictOut])
+def read_conflicts(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    technician_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """All double bookings in a date range (default: the next 7 days), for the calendar."""
+    if current_user.role == UserRole.TECHNICIAN:
+        technician_id = current_user.id
+    start = start or date.today()
+    end = end or start + timedelta(days=6)
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    return scan_conflicts(db, start, end, technician_id=technician_id)
+
+@router.get("/route", response_model=RouteOut)
+def read_route(
+    technician_id: Optional[int] = None,
+    day: Optional[date] = Query(None, alias="date"),
+    start_lat: Optional[float] = None,
+    start_long: Optional[float] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Travel-optimized order of a technician's jobs for one day (defaults: yourself, today)."""
+    technician_id = technician_id or current_user.id
+    if current_user.role == UserRole.TECHNICIAN and technician_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    day = day or date.today()
+    jobs = technician_jobs_query(db, technician_id, day).all()
+    route = plan_route(jobs, day, start=parse_coords(start_lat, start_long))
+    return {
+        "technician_id": technician_id,
+        "date": day,
+        "distance_km": route["distance_km"],
+        "naive_distance_km": route["naive_distance_km"],
+        "stops": route["stops"],
+        "unrouted": route["unrouted"],
+    }
+
 @router.get("/{job_id}", response_model=JobOut)
 def read_job(
     job_id: int, 
@@ -226,17 +354,8 @@ def read_job(
         raise HTTPException(status_code=404, detail="Job not found")
         
     # RBAC Check for single job view
-    user_role_str = str(current_user.role.value if hasattr(current_user.role, 'value') else current_user.role).lower()
-    
-    if user_role_str == "technician":
-        # Check if assigned directly or via team
-        is_assigned = any(
-            a.technician_id == current_user.id or 
-            (current_user.team_id and a.team_id == current_user.team_id) 
-            for a in job.assignments
-        )
-        if not is_assigned:
-             raise HTTPException(status_code=403, detail="Not authorized to view this job")
+    if not can_access_job(db, current_user, job_id):
+        raise HTTPException(status_code=403, detail="Not authorized to view this job")
 
     return job
 
@@ -244,6 +363,7 @@ def read_job(
 def update_job(
     job_id: int, 
     job_update: JobUpdate, 
+    allow_conflicts: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -252,19 +372,8 @@ def update_job(
         raise HTTPException(status_code=404, detail="Job not found")
     
     # RBAC Security: Technicians can only edit their own jobs
-    user_role_str = str(current_user.role.value if hasattr(current_user.role, 'value') else current_user.role).lower()
-    
-    if user_role_str == "technician":
-         # Verify assignment
-         is_assigned = db.query(Assignment).filter(
-            Assignment.job_id == job_id,
-            or_(
-                Assignment.technician_id == current_user.id,
-                Assignment.team_id == current_user.team_id if current_user.team_id else False
-            )
-         ).first()
-         
-         if not is_assigned:
+    if is_restricted(current_user):
+         if not can_access_job(db, current_user, job_id):
              raise HTTPException(status_code=403, detail="You are not authorized to edit this job")
          
          # Prevent Techs from re-assigning
@@ -277,13 +386,31 @@ def update_job(
     assignments_to_process = None
     if 'technician_ids' in update_data:
         assignments_to_process = update_data.pop('technician_ids')
+
+    # Re-check bookings when the assignees, the day or the time change
+    if not allow_conflicts and (
+        assignments_to_process is not None or 'scheduled_date' in update_data or 'scheduled_time' in update_data
+    ):
+        if assignments_to_process is not None:
+            check_ids = assignments_to_process
+        else:
+            # Team assignments count too, as on create
+            check_ids = job_assignee_ids(db, job_id)
+        _check_conflicts(
+            db,
+            check_ids,
+            update_data.get('scheduled_date', db_job.scheduled_date),
+            update_data.get('scheduled_time', db_job.scheduled_time),
+            job_id=job_id,
+            title=update_data.get('title', db_job.title)
+        )
         
     for key, value in update_data.items():
         setattr(db_job, key, value)
         
     # Handle assignments update
     if assignments_to_process is not None:
-        if user_role_str == "technician":
+        if is_restricted(current_user):
              # Double check prevention (should be caught above)
              pass
         else:
@@ -302,6 +429,7 @@ def update_job(
     db.add(db_job)
     db.commit()
     db.refresh(db_job)
+    invalidate_reports()
     return db_job
 
 @router.delete("/{job_id}", status_code=204)
@@ -319,6 +447,7 @@ def delete_job(
     
     db.delete(db_job)
     db.commit()
+    invalidate_reports()
     return None
 
 @router.post("/{job_id}/log", response_model=JobHistoryOut)
@@ -329,13 +458,13 @@ def add_job_log(
     current_user: User = Depends(get_current_user)
 ):
     db_job = db.query(Job).filter(Job.id == job_id).first()
-    if not db_job is None:
-        # Check permissions similar to update
-        pass # Assuming general read access is enough to comment for now, or refine later
-    
     if db_job is None:
         raise HTTPException(status_code=404, detail="Job not found")
 
+    # Same rule as viewing: technicians can only log on their own jobs
+    if not can_access_job(db, current_user, job_id):
+        raise HTTPException(status_code=403, detail="Not authorized to update this job")
+
     # If status is changing
     old_status = db_job.status
     if log_data.new_status and log_data.new_status != old_status:
@@ -353,6 +482,7 @@ def add_job_log(
     db.add(history)
     db.commit()
     db.refresh(history)
+    invalidate_reports()
     
     # Format output
     return JobHistoryOut(
@@ -1,15 +1,23 @@
 from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Query
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from datetime import date
 
 from app.api import deps
+from app.api.pagination import apply_keyset, encode_cursor
 from app.core.database import get_db
-from app.models.models import Project, User, UserRole, Job
+from app.core.intent_rules import invalidate_project_names
+from app.core.project_stats import project_stats_query, project_job_counts, project_progress_curve
+from app.core.visibility import scope_jobs
+from app.models.models import Project, User, UserRole, Job, JobStatus
 from pydantic import BaseModel
 
 router = APIRouter()
 
+MAX_PAGE_SIZE = 1000
+MAX_JOB_PAGE_SIZE = 500
+
 class ProjectBase(BaseModel):
     name: str
     description: Optional[str] = None
@@ -32,31 +40,86 @@ class ProjectOut(ProjectBase):
     class Config:
         from_attributes = True
 
+def _to_project_out(project: Project, job_count: int, completion_percentage: int) -> ProjectOut:
+    p_out = ProjectOut.from_orm(project)
+    p_out.job_count = job_count or 0
+    p_out.completion_percentage = completion_percentage or 0
+    return p_out
+
+class ProjectJobOut(BaseModel):
+    id: int
+    title: str
+    status: str
+    scheduled_date: Optional[date] = None
+    scheduled_time: Optional[str] = None
+    customer_name: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class ProjectProgressPoint(BaseModel):
+    date: date
+    completed: int
+    cumulative: int
+    percentage: int
+
+class ProjectProgressOut(BaseModel):
+    project_id: int
+    total_jobs: int
+    completed_jobs: int
+    progress: int
+    by_status: dict = {}
+    points: List[ProjectProgressPoint] = []
+
 @router.get("/", response_model=List[ProjectOut])
 def read_projects(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    search: Optional[str] = None,
+    status: Optional[str] = None,
+    min_progress: Optional[int] = None,
+    max_progress: Optional[int] = None,
+    sort_by: str = "id",
+    sort_desc: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user)
 ):
-    projects = db.query(Project).offset(skip).limit(limit).all()
-    results = []
-    
-    for p in projects:
-        p_out = ProjectOut.from_orm(p)
-        jobs = p.jobs
-        total_jobs = len(jobs)
-        p_out.job_count = total_jobs
-        
-        if total_jobs > 0:
-            completed_jobs = len([j for j in jobs if j.status == 'completed'])
-            p_out.completion_percentage = int((completed_jobs / total_jobs) * 100)
-        else:
-            p_out.completion_percentage = 0
-            
-        results.append(p_out)
-        
-    return results
+    query, job_count, completion = project_stats_query(db)
+
+    if search:
+        query = query.filter(Project.name.ilike(f"%{search}%"))
+    if status:
+        query = query.filter(Project.status == status)
+    if min_progress is not None:
+        query = query.filter(completion >= min_progress)
+    if max_progress is not None:
+        query = query.filter(completion <= max_progress)
+
+    # Nullable columns are coalesced so the keyset comparison stays well defined
+    sort_columns = {
+        "id": Project.id,
+        "name": func.coalesce(Project.name, ""),
+        "start_date": func.coalesce(Project.start_date, date(1900, 1, 1)),
+        "end_date": func.coalesce(Project.end_date, date(1900, 1, 1)),
+        "job_count": job_count,
+        "progress": completion,
+    }
+    if sort_by not in sort_columns:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of {list(sort_columns)}")
+    sort_expr = sort_columns[sort_by]
+
+    query = apply_keyset(query.add_columns(sort_expr.label("sort_value")), sort_expr, Project.id, cursor, sort_desc)
+    if not cursor:
+        query = query.offset(skip)
+    rows = query.limit(limit).all()
+
+    if len(rows) == limit:
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor([last.sort_value, last.Project.id])
+
+    return [_to_project_out(r.Project, r.job_count, r.completion_percentage) for r in rows]
 
 @router.post("/", response_model=ProjectOut)
 def create_project(
@@ -71,6 +134,7 @@ def create_project(
     db.add(db_project)
     db.commit()
     db.refresh(db_project)
+    invalidate_project_names()
     return db_project
 
 @router.get("/{project_id}", response_model=ProjectOut)
@@ -79,19 +143,76 @@ def read_project(
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user)
 ):
+    query, _, _ = project_stats_query(db)
+    row = query.filter(Project.id == project_id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    return _to_project_out(row.Project, row.job_count, row.completion_percentage)
+
+def _get_project_or_404(db: Session, project_id: int) -> Project:
     project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
-    
-    p_out = ProjectOut.from_orm(project)
-    jobs = project.jobs
-    total_jobs = len(jobs)
-    p_out.job_count = total_jobs
-    if total_jobs > 0:
-        completed = len([j for j in jobs if j.status == 'completed'])
-        p_out.completion_percentage = int((completed / total_jobs) * 100)
-        
-    return p_out
+    return project
+
+@router.get("/{project_id}/jobs", response_model=List[ProjectJobOut])
+def read_project_jobs(
+    project_id: int,
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_JOB_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[List[JobStatus]] = Query(None),
+    search: Optional[str] = None,
+    sort_by: str = "scheduled_date",
+    sort_desc: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """Compact, paginated job rows of one project."""
+    _get_project_or_404(db, project_id)
+
+    query = db.query(
+        Job.id, Job.title, Job.status, Job.scheduled_date, Job.scheduled_time, Job.customer_name
+    ).filter(Job.project_id == project_id)
+    query = scope_jobs(query, db, current_user)
+    if status:
+        query = query.filter(Job.status.in_(status))
+    if search:
+        query = query.filter(Job.title.ilike(f"%{search}%") | Job.customer_name.ilike(f"%{search}%"))
+
+    sort_columns = {
+        "id": Job.id,
+        "scheduled_date": func.coalesce(Job.scheduled_date, date(1900, 1, 1)),
+        "title": func.coalesce(Job.title, ""),
+    }
+    if sort_by not in sort_columns:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of {list(sort_columns)}")
+    sort_expr = sort_columns[sort_by]
+
+    query = apply_keyset(query.add_columns(sort_expr.label("sort_value")), sort_expr, Job.id, cursor, sort_desc)
+    rows = query.limit(limit).all()
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor([rows[-1].sort_value, rows[-1].id])
+    return rows
+
+@router.get("/{project_id}/progress", response_model=ProjectProgressOut)
+def read_project_progress(
+    project_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """Current job counts plus the cumulative completion curve (from JobHistory)."""
+    _get_project_or_404(db, project_id)
+    counts = project_job_counts(db, project_id)
+    return ProjectProgressOut(
+        project_id=project_id,
+        total_jobs=counts["total_jobs"],
+        completed_jobs=counts["completed_jobs"],
+        progress=counts["progress"],
+        by_status=counts["by_status"],
+        points=project_progress_curve(db, project_id)
+    )
 
 @router.put("/{project_id}", response_model=ProjectOut)
 def update_project(
@@ -112,6 +233,7 @@ def update_project(
         
     db.commit()
     db.refresh(db_project)
+    invalidate_project_names()
     return db_project
 
 @router.delete("/{project_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -129,4 +251,5 @@ def delete_project(
         
     db.delete(db_project)
     db.commit()
+    invalidate_project_names()
     return None
@@ -1,24 +1,75 @@
-from typing import Any, List, Dict
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import os
+import shutil
+from typing import Any, List, Dict, Optional
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, or_
 
 from app.api import deps
+from app.core.cache import CACHES, report_cache, report_scope
+from app.core.visibility import scope_jobs
 from app.core.database import get_db
-from app.models.models import Job, JobStatus, Project, User, UserRole, Assignment
+from app.core.export_jobs import exporter, submit_export, run_pending_exports, write_csv
+from app.core.analytics_export import export_tables, bundle
+from app.core.digest import digest_status, send_daily_digest
+from app.core.ai_agent import ai_agent
+from app.core.intent_rules import intent_stats
+from app.core.status_analytics import refresh_status_durations, get_job_status_durations, get_status_distribution
+from app.models.models import Job, JobStatus, JobHistory, Project, User, UserRole, Assignment, ExportJob, ExportStatus
 
 router = APIRouter()
 
+class ExportCreate(BaseModel):
+    kind: str = "jobs_csv" # jobs_csv, overdue_csv, analytics
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+    # analytics only
+    format: Optional[str] = None # parquet (default) or arrow
+    tables: Optional[List[str]] = None # jobs, assignments, job_history (default: all)
+    since: Optional[datetime] = None # incremental: rows created/updated after this watermark
+
+class ExportJobOut(BaseModel):
+    id: int
+    kind: str
+    status: str
+    progress: int = 0
+    total: Optional[int] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+EXPORT_COLUMNS = ["id", "title", "status", "customer", "date", "type", "project_id"]
+STATUS_DURATION_GROUPS = ["job_type", "team", "technician", "status"]
+TIMESERIES_METRICS = ["created", "completed", "overdue", "scheduled"]
+TIMESERIES_BUCKETS = ["day", "week", "month"]
+TIMESERIES_MAX_POINTS = 1000
+OVERDUE_COLUMNS = ["id", "title", "status", "scheduled_date", "scheduled_time", "technician", "overdue_duration"]
+
 @router.get("/summary")
 def get_summary_stats(
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user)
 ):
+    return report_cache.get_or_compute(
+        "summary", lambda: _compute_summary(db, current_user), scope=report_scope(current_user)
+    )
+
+def _compute_summary(db: Session, current_user: User):
     # Basic Stats
-    total_jobs = db.query(Job).count()
-    completed = db.query(Job).filter(Job.status == JobStatus.COMPLETED).count()
-    pending = db.query(Job).filter(Job.status == JobStatus.PENDING).count()
-    in_progress = db.query(Job).filter(Job.status == JobStatus.IN_PROGRESS).count()
+    jobs = scope_jobs(db.query(Job), db, current_user)
+    counts = dict(jobs.with_entities(Job.status, func.count(Job.id)).group_by(Job.status).all())
+    total_jobs = sum(counts.values())
+    completed = counts.get(JobStatus.COMPLETED.value, 0)
+    pending = counts.get(JobStatus.PENDING.value, 0)
+    in_progress = counts.get(JobStatus.IN_PROGRESS.value, 0)
     
     # Financials (Mock for now as we don't have revenue fields yet, or count sales)
     # total_revenue = ...
@@ -39,6 +90,11 @@ def get_jobs_by_technician(
     if current_user.role not in [UserRole.ADMIN, UserRole.STAFF]:
          raise HTTPException(status_code=403, detail="Not authorized")
 
+    return report_cache.get_or_compute(
+        "by_technician", lambda: _compute_jobs_by_technician(db), scope=report_scope(current_user)
+    )
+
+def _compute_jobs_by_technician(db: Session):
     # Group by technician
     # DB query to count assignments
     results = db.query(
@@ -50,56 +106,312 @@ def get_jobs_by_technician(
     data = [{"name": r[0], "count": r[1]} for r in results]
     return data
 
-    return data
-
 @router.get("/overdue")
 def get_overdue_jobs(
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user)
 ):
-    from datetime import datetime, date
-    
+    return report_cache.get_or_compute(
+        "overdue", lambda: _compute_overdue(db, current_user), scope=report_scope(current_user)
+    )
+
+def _overdue_queries(db: Session, today: date, current_user: Optional[User] = None):
     # Logic: Status NOT Completed/Cancelled AND (Date < Today OR (Date == Today and Time < Now))
-    today = date.today()
     now_time = datetime.now().strftime("%H:%M")
     
     # 1. Past dates
-    overdue_query = db.query(Job).filter(
+    jobs = scope_jobs(db.query(Job), db, current_user) if current_user else db.query(Job)
+    overdue_query = jobs.filter(
         Job.status.notin_([JobStatus.COMPLETED, JobStatus.CANCELLED]),
         Job.scheduled_date < today
     )
     
     # 2. Today but past time (if time is set)
     # Using python filtering for time comparison to avoid complex SQL for string time
-    today_jobs = db.query(Job).filter(
+    today_query = jobs.filter(
         Job.status.notin_([JobStatus.COMPLETED, JobStatus.CANCELLED]),
         Job.scheduled_date == today,
         Job.scheduled_time < now_time,
         Job.scheduled_time != None # explicit check
-    ).all()
-    
-    results = overdue_query.all() + today_jobs
-    
-    # Format
-    data = []
-    for job in results:
-        delta = (today - job.scheduled_date).days
-        if delta == 0:
-            duration = "Today"
-        else:
-            duration = f"{delta} days"
-            
-        data.append({
-            "id": job.id,
-            "title": job.title,
-            "status": job.status,
-            "scheduled_date": job.scheduled_date,
-            "scheduled_time": job.scheduled_time,
-            "technician": ", ".join([a.technician.full_name for a in job.assignments if a.technician]) if job.assignments else "Unassigned",
-            "overdue_duration": duration
-        })
-        
-    return data
+    )
+    return [overdue_query, today_query]
+
+def _overdue_row(job: Job, today: date) -> Dict[str, Any]:
+    delta = (today - job.scheduled_date).days
+    if delta == 0:
+        duration = "Today"
+    else:
+        duration = f"{delta} days"
+
+    return {
+        "id": job.id,
+        "title": job.title,
+        "status": job.status,
+        "scheduled_date": job.scheduled_date,
+        "scheduled_time": job.scheduled_time,
+        "technician": ", ".join([a.technician.full_name for a in job.assignments if a.technician]) if job.assignments else "Unassigned",
+        "overdue_duration": duration
+    }
+
+def _compute_overdue(db: Session, current_user: Optional[User] = None):
+    today = date.today()
+    return [
+        _overdue_row(job, today)
+        for query in _overdue_queries(db, today, current_user)
+        for job in query.all()
+    ]
+
+@router.get("/dashboard")
+def get_dashboard_stats(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    # Cached per day as well, since "completed today" rolls over at midnight
+    today = date.today()
+    return report_cache.get_or_compute(
+        "dashboard", lambda: _compute_dashboard(db, today, current_user),
+        params={"date": today.isoformat()}, scope=report_scope(current_user)
+    )
+
+def _compute_dashboard(db: Session, today, current_user: User):
+    query = scope_jobs(db.query(Job), db, current_user)
+
+    counts = dict(
+        query.with_entities(Job.status, func.count(Job.id)).group_by(Job.status).all()
+    )
+    completed_today = query.filter(
+        Job.status == JobStatus.COMPLETED,
+        Job.scheduled_date == today
+    ).count()
+    return {
+        "pending": counts.get(JobStatus.PENDING.value, 0),
+        "in_progress": counts.get(JobStatus.IN_PROGRESS.value, 0),
+        "completed_today": completed_today,
+    }
+
+def _bucket_start(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday()) # Monday, same as date_trunc('week')
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+def _next_bucket(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day + timedelta(days=7)
+    if bucket == "month":
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+def _bucket_expr(db: Session, column, bucket: str):
+    """SQL expression truncating `column` to the start of its bucket."""
+    if db.bind.dialect.name == "postgresql":
+        return func.date_trunc(bucket, column)
+    # SQLite (dev): equivalent truncation with date modifiers
+    if bucket == "week":
+        return func.date(column, "-6 days", "weekday 1")
+    if bucket == "month":
+        return func.date(column, "start of month")
+    return func.date(column)
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+@router.get("/timeseries")
+def get_timeseries(
+    metric: str = Query("created"),
+    bucket: str = Query("day"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    Bucketed job counts for charts: created, completed (from JobHistory), overdue or scheduled.
+    Every bucket between start and end is returned, empty ones as 0.
+    """
+    if metric not in TIMESERIES_METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {TIMESERIES_METRICS}")
+    if bucket not in TIMESERIES_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {TIMESERIES_BUCKETS}")
+
+    end = end or date.today()
+    if not start:
+        default_span = {"day": timedelta(days=29), "week": timedelta(weeks=11), "month": timedelta(days=365)}
+        start = end - default_span[bucket]
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    start = _bucket_start(start, bucket)
+    buckets = []
+    day = start
+    while day <= end:
+        buckets.append(day)
+        day = _next_bucket(day, bucket)
+        if len(buckets) > TIMESERIES_MAX_POINTS:
+            raise HTTPException(status_code=400, detail="Range too large for this bucket size")
+
+    params = {"metric": metric, "bucket": bucket, "start": start.isoformat(), "end": end.isoformat()}
+    return report_cache.get_or_compute(
+        "timeseries",
+        lambda: _compute_timeseries(db, current_user, metric, bucket, buckets, start, end),
+        params=params, scope=report_scope(current_user)
+    )
+
+def _compute_timeseries(db: Session, current_user: User, metric: str, bucket: str, buckets: List[date], start: date, end: date):
+    range_end = _next_bucket(_bucket_start(end, bucket), bucket)
+
+    if metric == "created":
+        bucket_col = _bucket_expr(db, Job.created_at, bucket)
+        query = db.query(bucket_col, func.count(Job.id)).filter(
+            Job.created_at >= start,
+            Job.created_at < range_end
+        )
+        query = scope_jobs(query, db, current_user)
+    elif metric == "completed":
+        # Completion time = when the job transitioned into completed
+        bucket_col = _bucket_expr(db, JobHistory.created_at, bucket)
+        query = db.query(bucket_col, func.count(func.distinct(JobHistory.job_id))).filter(
+            JobHistory.new_status == JobStatus.COMPLETED,
+            or_(JobHistory.old_status.is_(None), JobHistory.old_status != JobStatus.COMPLETED),
+            JobHistory.created_at >= start,
+            JobHistory.created_at < range_end
+        )
+        query = scope_jobs(query, db, current_user, JobHistory.job_id)
+    else:
+        # scheduled: workload per day ; overdue: scheduled in the past and still open
+        bucket_col = _bucket_expr(db, Job.scheduled_date, bucket)
+        query = db.query(bucket_col, func.count(Job.id)).filter(
+            Job.scheduled_date >= start,
+            Job.scheduled_date < range_end
+        )
+        if metric == "overdue":
+            query = query.filter(
+                Job.status.notin_([JobStatus.COMPLETED, JobStatus.CANCELLED]),
+                Job.scheduled_date < date.today()
+            )
+        query = scope_jobs(query, db, current_user)
+
+    counts = {}
+    for bucket_value, count in query.group_by(bucket_col).all():
+        if bucket_value is not None:
+            counts[_as_date(bucket_value)] = count
+
+    return {
+        "metric": metric,
+        "bucket": bucket,
+        "start": start,
+        "end": end,
+        "points": [{"bucket": b, "count": counts.get(b, 0)} for b in buckets]
+    }
+
+@router.get("/status_durations")
+def get_status_durations(
+    group_by: str = Query("job_type"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """Time spent in each status (closed segments), per job_type, team, technician or status."""
+    if group_by not in STATUS_DURATION_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {STATUS_DURATION_GROUPS}")
+
+    def compute():
+        refresh_status_durations(db) # Catch up on transitions written since the last call
+        job_id_filter = None
+        if current_user.role == UserRole.TECHNICIAN:
+            job_id_filter = scope_jobs(db.query(Job.id), db, current_user)
+        return get_status_distribution(
+            db, group_by=group_by,
+            start=start, end=end + timedelta(days=1) if end else None,
+            job_id_filter=job_id_filter
+        )
+
+    params = {"group_by": group_by, "start": start, "end": end}
+    return report_cache.get_or_compute("status_durations", compute, params=params, scope=report_scope(current_user))
+
+@router.get("/status_durations/jobs/{job_id}")
+def get_job_status_timeline(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    job_query = scope_jobs(db.query(Job.id).filter(Job.id == job_id), db, current_user)
+    if not job_query.first():
+        raise HTTPException(status_code=404, detail="Job not found")
+    refresh_status_durations(db)
+    return get_job_status_durations(db, job_id)
+
+@router.post("/status_durations/rebuild")
+def rebuild_status_durations(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    jobs = refresh_status_durations(db, rebuild=True)
+    report_cache.invalidate("status_durations")
+    return {"jobs_rebuilt": jobs}
+
+@router.get("/cache")
+def get_cache_stats(
+    current_user: User = Depends(deps.get_current_user)
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return {namespace: cache.stats() for namespace, cache in CACHES.items()}
+
+@router.get("/intents")
+def get_intent_stats(
+    current_user: User = Depends(deps.get_current_user)
+):
+    """How many bot messages the rule-based parser answered without the AI, and how the AI calls went (this process)."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return {**intent_stats(), "ai": ai_agent.stats()}
+
+def _run_digest(day: date):
+    asyncio.run(send_daily_digest(day))
+
+@router.get("/digest")
+def get_digest_status(
+    day: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """Delivery status of the technicians' morning digest."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return digest_status(db, day or date.today())
+
+@router.post("/digest", status_code=202)
+def send_digest(
+    background_tasks: BackgroundTasks,
+    day: Optional[date] = None,
+    current_user: User = Depends(deps.get_current_user)
+):
+    """Send (or finish sending) the digest now; technicians already reached are skipped."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    day = day or date.today()
+    background_tasks.add_task(_run_digest, day)
+    return {"day": day, "status": "queued"}
+
+def _export_row(job: Job) -> Dict[str, Any]:
+    return {
+        "id": job.id,
+        "title": job.title,
+        "status": job.status,
+        "customer": job.customer_name,
+        "date": job.scheduled_date,
+        "type": job.job_type,
+        "project_id": job.project_id
+    }
 
 @router.get("/export")
 def export_data(
@@ -107,16 +419,119 @@ def export_data(
     current_user: User = Depends(deps.get_current_user)
 ):
     # Return flat list for CSV export
+    # Large ranges should go through POST /exports instead (runs in the background)
     jobs = db.query(Job).all()
-    data = []
-    for job in jobs:
-        data.append({
-            "id": job.id,
-            "title": job.title,
-            "status": job.status,
-            "customer": job.customer_name,
-            "date": job.scheduled_date,
-            "type": job.job_type,
-            "project_id": job.project_id
-        })
-    return data
+    return [_export_row(job) for job in jobs]
+
+@exporter("jobs_csv")
+def _export_jobs_csv(db: Session, params: Dict, path: str, progress) -> int:
+    query = db.query(Job)
+    if params.get("start_date"):
+        query = query.filter(Job.scheduled_date >= date.fromisoformat(params["start_date"]))
+    if params.get("end_date"):
+        query = query.filter(Job.scheduled_date <= date.fromisoformat(params["end_date"]))
+
+    total = query.count()
+    rows = (_export_row(job) for job in query.order_by(Job.id.asc()).yield_per(500))
+    return write_csv(path, EXPORT_COLUMNS, rows, progress, total=total)
+
+@exporter("overdue_csv")
+def _export_overdue_csv(db: Session, params: Dict, path: str, progress) -> int:
+    # Streamed like jobs_csv, so the heartbeat keeps going while rows are built
+    today = date.today()
+    queries = _overdue_queries(db, today)
+    total = sum(query.count() for query in queries)
+    rows = (
+        _overdue_row(job, today)
+        for query in queries
+        for job in query.order_by(Job.id.asc()).yield_per(500)
+    )
+    return write_csv(path, OVERDUE_COLUMNS, rows, progress, total=total)
+
+@exporter("analytics", extension="zip")
+def _export_analytics(db: Session, params: Dict, path: str, progress) -> int:
+    # Parquet/Arrow files plus manifest.json (with the next watermark), bundled as one download
+    out_dir = os.path.splitext(path)[0]
+    since = datetime.fromisoformat(params["since"]) if params.get("since") else None
+    try:
+        manifest = export_tables(
+            db, out_dir,
+            tables=params.get("tables"),
+            fmt=params.get("format") or "parquet",
+            since=since,
+            progress=progress
+        )
+        bundle(out_dir, path)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return sum(t["rows"] for t in manifest["tables"].values())
+
+def _get_export_or_404(db: Session, export_id: int, current_user: User) -> ExportJob:
+    export_job = db.query(ExportJob).filter(ExportJob.id == export_id).first()
+    if not export_job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    if export_job.created_by != current_user.id and current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return export_job
+
+@router.post("/exports", response_model=ExportJobOut, status_code=202)
+def create_export(
+    export_in: ExportCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    if current_user.role not in [UserRole.ADMIN, UserRole.STAFF]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    params = export_in.dict(exclude={"kind"}, exclude_none=True)
+    try:
+        export_job = submit_export(db, export_in.kind, params, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Runs after the response is sent; other instances can also pick it up from the table
+    background_tasks.add_task(run_pending_exports)
+    return export_job
+
+@router.get("/exports", response_model=List[ExportJobOut])
+def read_exports(
+    limit: int = 20,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    return db.query(ExportJob).filter(
+        ExportJob.created_by == current_user.id
+    ).order_by(ExportJob.id.desc()).limit(limit).all()
+
+@router.get("/exports/{export_id}", response_model=ExportJobOut)
+def read_export(
+    export_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    export_job = _get_export_or_404(db, export_id, current_user)
+    # Polling doubles as a nudge, in case the instance that accepted the export went away
+    if export_job.status in [ExportStatus.QUEUED, ExportStatus.RUNNING]:
+        background_tasks.add_task(run_pending_exports)
+    return export_job
+
+@router.get("/exports/{export_id}/download")
+def download_export(
+    export_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    export_job = _get_export_or_404(db, export_id, current_user)
+    if export_job.status != ExportStatus.COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Export is {export_job.status}")
+    if not export_job.file_path or not os.path.exists(export_job.file_path):
+        # Files live on the local disk of the instance that produced them
+        raise HTTPException(status_code=410, detail="Export file is no longer available, please export again")
+    media_type = "application/zip" if export_job.file_path.endswith(".zip") else "text/csv"
+    return FileResponse(
+        export_job.file_path,
+        media_type=media_type,
+        filename=os.path.basename(export_job.file_path)
+    )
@@ -1,10 +1,11 @@
 from typing import Any, List
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
 
 from app.api import deps
 from app.core.database import get_db
-from app.models.models import Team, User, UserRole
+from app.models.models import Team, User, UserRole, Assignment, Job, JobStatus
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -29,24 +30,59 @@ class MemberOut(BaseModel):
 class TeamOut(TeamBase):
     id: int
     member_count: int = 0
+    active_job_count: int = 0
     members: List[MemberOut] = []
     
     class Config:
         from_attributes = True
 
+ACTIVE_JOB_STATUSES = [JobStatus.PENDING, JobStatus.ASSIGNED, JobStatus.IN_PROGRESS]
+
 @router.get("/", response_model=List[TeamOut])
 def read_teams(
+    include_members: bool = True,
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user)
 ):
-    teams = db.query(Team).all()
-    # Manual mapping to include member count efficiently
+    # Counts come from grouped subqueries, members (if wanted) from one selectin query
+    member_counts = db.query(
+        User.team_id.label("team_id"),
+        func.count(User.id).label("member_count")
+    ).filter(User.team_id.isnot(None)).group_by(User.team_id).subquery()
+
+    # A job counts for a team if assigned to the team itself or to one of its members
+    assignment_team = func.coalesce(Assignment.team_id, User.team_id)
+    active_jobs = db.query(
+        assignment_team.label("team_id"),
+        func.count(func.distinct(Assignment.job_id)).label("active_job_count")
+    ).join(Job, Job.id == Assignment.job_id).outerjoin(
+        User, User.id == Assignment.technician_id
+    ).filter(
+        Job.status.in_(ACTIVE_JOB_STATUSES)
+    ).group_by(assignment_team).subquery()
+
+    query = db.query(
+        Team,
+        func.coalesce(member_counts.c.member_count, 0),
+        func.coalesce(active_jobs.c.active_job_count, 0)
+    ).outerjoin(
+        member_counts, member_counts.c.team_id == Team.id
+    ).outerjoin(
+        active_jobs, active_jobs.c.team_id == Team.id
+    ).order_by(Team.name)
+    if include_members:
+        query = query.options(selectinload(Team.members))
+
     results = []
-    for t in teams:
-        t_out = TeamOut.from_orm(t)
-        t_out.member_count = len(t.members)
-        # Populate members
-        t_out.members = [MemberOut.from_orm(m) for m in t.members]
+    for team, member_count, active_job_count in query.all():
+        t_out = TeamOut(
+            id=team.id,
+            name=team.name,
+            color=team.color,
+            member_count=member_count,
+            active_job_count=active_job_count,
+            members=[MemberOut.from_orm(m) for m in team.members] if include_members else []
+        )
         results.append(t_out)
     return results
 
@@ -1,11 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, UploadFile, File
+from sqlalchemy import func, or_, and_
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from datetime import date, timedelta
 from app.core.database import get_db
-from app.models.models import User, UserRole
+from app.models.models import User, UserRole, Team
 from pydantic import BaseModel
 from app.core.security import get_password_hash
 from app.api.deps import get_current_user
+from app.api.pagination import apply_keyset, encode_cursor
+from app.core.config import settings
+from app.core.user_import import parse_rows, import_users
+from app.core.cache import report_cache
+from app.core.workload import technician_day_loads
+from app.core.visibility import invalidate_user
+from app.core.bot_services import invalidate_bot_users
 
 router = APIRouter()
 
@@ -37,6 +46,32 @@ class UserOut(UserBase):
     class Config:
         from_attributes = True
 
+class UserPickerOut(BaseModel):
+    id: int
+    full_name: str
+    role: str
+    team_id: Optional[int] = None
+    team_color: Optional[str] = None
+    class Config:
+        from_attributes = True
+
+class AvailabilityRow(BaseModel):
+    user_id: int
+    full_name: Optional[str] = None
+    team_id: Optional[int] = None
+    job_counts: List[int] # one entry per day in `days`
+    time_windows: List[List[str]]
+    total_jobs: int
+
+class AvailabilityOut(BaseModel):
+    start: date
+    end: date
+    days: List[date]
+    technicians: List[AvailabilityRow]
+
+MAX_PAGE_SIZE = 1000
+MAX_AVAILABILITY_DAYS = 62
+
 @router.post("/", response_model=UserOut)
 def create_user(user: UserCreate, db: Session = Depends(get_db)):
     db_user = db.query(User).filter(User.username == user.username).first()
@@ -58,8 +93,39 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    invalidate_bot_users(db_user.telegram_id)
     return db_user
 
+@router.post("/import")
+def import_users_file(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    dry_run: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Bulk create users from a CSV or JSON file (columns: username, password, full_name,
+    role, phone_number, email, telegram_id, team_id or team). Invalid rows are reported, not fatal;
+    an error's "row" is the data row number (1 = first user, the CSV header is not counted).
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    fmt = format or ("json" if (file.filename or "").lower().endswith(".json") else "csv")
+    try:
+        rows = parse_rows(file.file.read(), fmt)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read file: {e}")
+    if len(rows) > settings.USER_IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"Too many rows (max {settings.USER_IMPORT_MAX_ROWS})")
+
+    result = import_users(db, rows, dry_run=dry_run)
+    if result["created"]:
+        # Chats that were unlinked until now may be cached as such
+        invalidate_bot_users(*[row.get("telegram_id") for row in rows if isinstance(row, dict)])
+    return result
+
 @router.get("/me", response_model=UserOut)
 def read_user_me(
     current_user: User = Depends(get_current_user)
@@ -73,6 +139,7 @@ def update_user_me(
     current_user: User = Depends(get_current_user)
 ):
     update_data = user_update.dict(exclude_unset=True)
+    old_telegram_id = current_user.telegram_id
     
     if 'password' in update_data:
         password = update_data.pop('password')
@@ -84,13 +151,133 @@ def update_user_me(
     db.add(current_user)
     db.commit()
     db.refresh(current_user)
+    invalidate_user(current_user.id)
+    invalidate_bot_users(old_telegram_id, current_user.telegram_id)
     return current_user
 
 
+def _filter_users(
+    query,
+    role: Optional[List[UserRole]] = None,
+    team_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+    q: Optional[str] = None
+):
+    if role:
+        query = query.filter(User.role.in_([r.value for r in role]))
+    if team_id is not None:
+        query = query.filter(User.team_id == team_id)
+    if is_active is not None:
+        query = query.filter(User.is_active == is_active)
+    if q:
+        term = f"%{q}%"
+        query = query.filter(or_(
+            User.full_name.ilike(term),
+            User.username.ilike(term),
+            User.phone_number.ilike(term),
+            User.email.ilike(term)
+        ))
+    return query
+
+def _page(query, response: Response, cursor: Optional[str], limit: int, sort_by: str, row_id, skip: int = 0):
+    """Keyset page over (sort_by, id); the next cursor goes out in the X-Next-Cursor header."""
+    sort_columns = {"id": User.id, "full_name": func.coalesce(User.full_name, "")}
+    if sort_by not in sort_columns:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of {list(sort_columns)}")
+    sort_expr = sort_columns[sort_by]
+
+    query = apply_keyset(query.add_columns(sort_expr.label("sort_value")), sort_expr, User.id, cursor)
+    if not cursor and skip:
+        query = query.offset(skip)
+    rows = query.limit(limit).all()
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor([rows[-1].sort_value, row_id(rows[-1])])
+    return rows
+
 @router.get("/", response_model=List[UserOut])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
+def read_users(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    role: Optional[List[UserRole]] = Query(None),
+    team_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+    q: Optional[str] = None,
+    sort_by: str = "id",
+    db: Session = Depends(get_db)
+):
+    query = _filter_users(db.query(User), role, team_id, is_active, q)
+    rows = _page(query, response, cursor, limit, sort_by, lambda row: row.User.id, skip)
+    return [row.User for row in rows]
+
+@router.get("/picker", response_model=List[UserPickerOut])
+def read_user_picker(
+    response: Response,
+    limit: int = Query(500, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    role: Optional[List[UserRole]] = Query(None),
+    team_id: Optional[int] = None,
+    is_active: Optional[bool] = True,
+    q: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Compact rows for assignment dropdowns: no password hash, contact data or ORM objects."""
+    query = db.query(
+        User.id, User.full_name, User.role, User.team_id, Team.color.label("team_color")
+    ).outerjoin(Team, Team.id == User.team_id)
+    query = _filter_users(query, role, team_id, is_active, q)
+    return _page(query, response, cursor, limit, "full_name", lambda row: row.id)
+
+def _compute_availability(db: Session, start: date, end: date, team_id: Optional[int]) -> dict:
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    loads = technician_day_loads(db, start, end, team_id=team_id)
+
+    # Every active technician gets a row, idle ones included; plus anyone else carrying load
+    condition = and_(User.role == UserRole.TECHNICIAN, User.is_active == True)
+    loaded_ids = {user_id for user_id, _ in loads}
+    if loaded_ids:
+        condition = or_(condition, User.id.in_(loaded_ids))
+    query = db.query(User.id, User.full_name, User.team_id).filter(condition)
+    if team_id is not None:
+        query = query.filter(User.team_id == team_id)
+
+    rows = []
+    for user_id, full_name, user_team_id in query.order_by(User.full_name, User.id).all():
+        cells = [loads.get((user_id, day), {"job_count": 0, "time_windows": []}) for day in days]
+        rows.append({
+            "user_id": user_id,
+            "full_name": full_name,
+            "team_id": user_team_id,
+            "job_counts": [cell["job_count"] for cell in cells],
+            "time_windows": [cell["time_windows"] for cell in cells],
+            "total_jobs": sum(cell["job_count"] for cell in cells),
+        })
+    return {"start": start, "end": end, "days": days, "technicians": rows}
+
+@router.get("/availability", response_model=AvailabilityOut)
+def read_availability(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    team_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Technician x day matrix of scheduled job counts and time slots (defaults to the next 7 days)."""
+    start = start or date.today()
+    end = end or start + timedelta(days=6)
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if (end - start).days >= MAX_AVAILABILITY_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range too long (max {MAX_AVAILABILITY_DAYS} days)")
+
+    # Job writes clear the reports namespace, so a cached matrix never outlives an assignment change
+    return report_cache.get_or_compute(
+        "availability",
+        lambda: _compute_availability(db, start, end, team_id),
+        params={"start": start, "end": end, "team_id": team_id}
+    )
 
 @router.get("/{user_id}", response_model=UserOut)
 def read_user(user_id: int, db: Session = Depends(get_db)):
@@ -111,6 +298,7 @@ def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get
     pass
     
     update_data = user_update.dict(exclude_unset=True)
+    old_telegram_id = db_user.telegram_id
     if 'password' in update_data:
         password = update_data.pop('password')
         db_user.password_hash = get_password_hash(password)
@@ -121,6 +309,8 @@ def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    invalidate_user(db_user.id)
+    invalidate_bot_users(old_telegram_id, db_user.telegram_id)
     return db_user
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -133,6 +323,9 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
     # PERMISSION CHECK: Admin only
     # Real app: if current_user.role != UserRole.ADMIN: raise 403
     
+    telegram_id = db_user.telegram_id
     db.delete(db_user)
     db.commit()
+    invalidate_user(user_id)
+    invalidate_bot_users(telegram_id)
     return None
@@ -0,0 +1,60 @@
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+# Keyset (cursor) pagination helpers.
+# The cursor is an opaque base64 token holding the sort values of the last row served;
+# the next page starts strictly after that row, so deep pages cost the same as the first.
+
+
+def encode_cursor(values: List[Any]) -> str:
+    raw = json.dumps(values, default=lambda v: v.isoformat() if hasattr(v, "isoformat") else str(v))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def _coerce(value, expr):
+    # JSON only keeps strings/numbers; turn dates back into what the column binds
+    if value is None or not isinstance(value, str):
+        return value
+    try:
+        python_type = expr.type.python_type
+    except (NotImplementedError, AttributeError):
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return value
+
+
+def apply_keyset(query, sort_expr, id_col, cursor: Optional[str], desc: bool = False):
+    """Order by (sort_expr, id) and, if a cursor is given, start after the row it points at."""
+    if desc:
+        query = query.order_by(sort_expr.desc(), id_col.desc())
+    else:
+        query = query.order_by(sort_expr.asc(), id_col.asc())
+
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != 2:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        last_value, last_id = _coerce(values[0], sort_expr), values[1]
+        if desc:
+            query = query.filter(or_(sort_expr < last_value, and_(sort_expr == last_value, id_col < last_id)))
+        else:
+            query = query.filter(or_(sort_expr > last_value, and_(sort_expr == last_value, id_col > last_id)))
+    return query
@@ -1,8 +1,114 @@
 from google import genai
+from google.genai import errors
+from app.core.cache import ResultCache, create_backend
 from app.core.config import settings
+from app.core.intent_rules import MIN_CONFIDENCE, parse_intent
+import asyncio
+import copy
 import json
+import re
+import random
+import threading
+import time
+from collections import Counter, deque
 from datetime import datetime
 
+# Read-only intents whose result depends only on the text and the date. UPDATE_JOB is never
+# cached (a replayed answer would change a job's status), nor are OTHER_CHAT replies, which
+# include the rate-limit and error messages.
+CACHEABLE_INTENTS = {"QUERY_JOBS", "GET_JOB_DETAILS", "PROFILE_PASSWORD", "QUERY_PROJECTS"}
+# Confident rule matches never reach the model (handle_message answers them first). While the
+# model is unavailable, a partial match is still good enough for these read-only listings,
+# unless the message names a job number (e.g. "done 45 now", which is about one job).
+FALLBACK_INTENTS = {"QUERY_JOBS", "QUERY_PROJECTS"}
+
+intent_cache = ResultCache(
+    "ai_intents",
+    ttl=settings.AI_INTENT_CACHE_TTL,
+    backend=create_backend(max_entries=settings.AI_INTENT_CACHE_SIZE, backend=settings.AI_INTENT_CACHE_BACKEND)
+)
+
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8
+LATENCY_SAMPLES = 500 # most recent calls kept for the percentiles
+
+BUSY_REPLY = "⚠️ **System Busy (Rate Limit):**\nI'm receiving too many requests right now. Please wait ~30 seconds and try again."
+ERROR_REPLY = "Sorry, I encountered an error responding to that. Please try again."
+UNAVAILABLE_REPLY = "⚠️ The assistant is unavailable right now. Commands like /today and /week still work, or try again in a minute."
+
+
+def is_cacheable(result) -> bool:
+    if not isinstance(result, dict) or result.get("intent") not in CACHEABLE_INTENTS:
+        return False
+    if result.get("source") == "rules":
+        return False # a fallback guess made while the model was unavailable
+    return isinstance(result.get("params", result.get("parameters")), dict)
+
+
+def cache_text(text: str) -> str:
+    """Cache key for a message: case and spacing only, so "?" and every other word still count."""
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+class CircuitBreaker:
+    """
+    Stops calling a degraded service: after `failures` consecutive errors the circuit opens and
+    calls are refused for `cooldown` seconds, then a single trial call decides whether it closes.
+    A trial that never reports back (e.g. its task was cancelled) is replaced after another cooldown.
+    """
+
+    def __init__(self, failures: int, cooldown: float):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._trial_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if (self.state == "open" and now - self._opened_at >= self.cooldown) or (
+                self.state == "half_open" and now - self._trial_at >= self.cooldown
+            ):
+                self.state = "half_open" # let one trial call through
+                self._trial_at = now
+                return True
+            return False
+
+    def release(self):
+        """The call ended without an outcome (cancelled); a pending trial may be retried at once."""
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self._opened_at = time.monotonic() - self.cooldown
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._consecutive = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self.state == "half_open" or self._consecutive >= self.failures:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Rate limits and server errors are worth another attempt; bad requests are not."""
+    return isinstance(error, errors.ServerError) or (isinstance(error, errors.APIError) and error.code == 429)
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter, so bot chats that hit the limit together do not retry together
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
 class AIWorkOrderAgent:
     def __init__(self):
         if settings.GOOGLE_API_KEY and settings.GOOGLE_API_KEY != "YOUR_GOOGLE_API_KEY_HERE":
@@ -10,15 +116,32 @@ class AIWorkOrderAgent:
             self.model_id = 'gemini-2.0-flash'
         else:
             self.client = None
+        self.breaker = CircuitBreaker(settings.AI_BREAKER_FAILURES, settings.AI_BREAKER_COOLDOWN)
+        self._semaphore = None
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._counts = Counter()
 
-    def analyze_intent(self, text: str):
+    async def analyze_intent(self, text: str):
         """
         Analyze user text and return an Intent JSON.
+        Read-only results are cached per message and day, since relative dates are resolved by the model.
         """
         if not self.client:
             return {"error": "AI not configured"}
-        
-        prompt = f"""
+
+        today = datetime.now().strftime('%Y-%m-%d')
+        params = {"text": cache_text(text), "day": today}
+        cached = intent_cache.get("intent", params)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
+        result = await self._ask_model(text, today)
+        if is_cacheable(result):
+            intent_cache.set("intent", result, params)
+        return copy.deepcopy(result)
+
+    def _prompt(self, text: str, today: str) -> str:
+        return f"""
         You are an assistant for a Field Service Management System.
         Analyze the input text and extract the INTENT and PARAMETERS.
         Return ONLY valid JSON with this exact structure:
@@ -27,7 +150,7 @@ class AIWorkOrderAgent:
             "params": {{ ... }}
         }}
         
-        Current Date: {datetime.now().strftime('%Y-%m-%d')}
+        Current Date: {today}
         
         Intents:
         1. QUERY_JOBS: User asks about tasks/jobs/schedule.
@@ -59,30 +182,105 @@ class AIWorkOrderAgent:
         Input: "{text}"
         JSON:
         """
-        
+
+    async def _generate(self, prompt: str):
+        # Created on first use, inside the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.AI_MAX_CONCURRENCY)
+        async with self._semaphore:
+            return await self.client.aio.models.generate_content(model=self.model_id, contents=prompt)
+
+    async def _ask_model(self, text: str, today: str):
+        """Ask the model unless the circuit is open; failures fall back to the rules or an apology."""
+        if not self.breaker.allow():
+            self._counts["short_circuited"] += 1
+            return self._fallback(text, UNAVAILABLE_REPLY)
+
+        settled = False
+        try:
+            response, rate_limited = await self._call_with_retries(self._prompt(text, today))
+            settled = True
+        finally:
+            if not settled:
+                self.breaker.release()
+
+        if response is None:
+            self.breaker.record_failure()
+            return self._fallback(text, BUSY_REPLY if rate_limited else ERROR_REPLY)
+        self.breaker.record_success()
         try:
-            response = self.client.models.generate_content(
-                model=self.model_id,
-                contents=prompt
-            )
             content = response.text.replace("```json", "").replace("```", "").strip()
             return json.loads(content)
         except Exception as e:
-            error_str = str(e)
-            print(f"AI Error: {error_str}")
-            
-            if "429" in error_str or "Quota exceeded" in error_str:
-                return {
-                    "intent": "OTHER_CHAT", 
-                    "params": {
-                        "reply": "⚠️ **System Busy (Rate Limit):**\nI'm receiving too many requests right now. Please wait ~30 seconds and try again."
-                    }
-                }
-                
-            return {
-                "intent": "OTHER_CHAT", 
-                "params": {"reply": "Sorry, I encountered an error responding to that. Please try again."}
-            }
+            print(f"AI Error: unreadable response: {e}")
+            return self._fallback(text, ERROR_REPLY)
+
+    async def _call_with_retries(self, prompt: str):
+        """
+        One deadline for all attempts; rate limits and server errors are retried with backoff.
+        Returns (response or None, whether the last failure was a rate limit).
+        """
+        deadline = time.monotonic() + settings.AI_TIMEOUT_SECONDS
+        rate_limited = False
+        for attempt in range(settings.AI_MAX_RETRIES + 1):
+            started = time.monotonic()
+            try:
+                response = await asyncio.wait_for(self._generate(prompt), deadline - started)
+            except asyncio.TimeoutError:
+                self._record(started, "timeouts")
+                break
+            except Exception as e:
+                self._record(started, "errors")
+                print(f"AI Error: {e}")
+                rate_limited = isinstance(e, errors.APIError) and e.code == 429
+                if rate_limited:
+                    self._counts["rate_limited"] += 1
+                if not _is_retryable(e):
+                    break
+                delay = _backoff(attempt)
+                if attempt == settings.AI_MAX_RETRIES or time.monotonic() + delay >= deadline:
+                    break
+                self._counts["retries"] += 1
+                await asyncio.sleep(delay)
+                continue
+
+            self._record(started, "successes")
+            return response, False
+        return None, rate_limited
+
+    def _fallback(self, text: str, reply: str):
+        """
+        The rules' answer when the model cannot give one: a confident match, or a partial one for
+        a read-only listing. Anything else (updates above all) gets an apology instead.
+        """
+        result = parse_intent(text)
+        listing = result and result["intent"] in FALLBACK_INTENTS and not re.search(r"\d", text)
+        if result and (result["confidence"] >= MIN_CONFIDENCE or listing):
+            self._counts["fallbacks"] += 1
+            return result
+        return {"intent": "OTHER_CHAT", "params": {"reply": reply}}
+
+    def _record(self, started: float, outcome: str):
+        self._latencies.append(time.monotonic() - started)
+        self._counts["calls"] += 1
+        self._counts[outcome] += 1
+
+    def stats(self):
+        """Call counts, model latency (seconds) and circuit state since this process started."""
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3) if latencies else None
+
+        return {
+            **{key: self._counts.get(key, 0) for key in (
+                "calls", "successes", "timeouts", "errors", "rate_limited", "retries", "short_circuited", "fallbacks"
+            )},
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "latency_max": round(latencies[-1], 3) if latencies else None,
+            "circuit": self.breaker.state,
+        }
 
     def parse_job_request(self, text: str):
         # Legacy support or specific creation logic
@@ -0,0 +1,273 @@
+# Bot state in the database, so conversations and chat data survive across webhook instances.
+# PTB loads persisted state once in initialize() and only writes it back every update_interval.
+# With webhooks on several instances that is not enough, so in shared mode:
+#   * nothing is bulk-loaded at start-up (cheaper cold starts);
+#   * before each update, the rows for its chat and user are read in one query (load_for_update)
+#     and copied into PTB's chat_data, user_data and conversation states;
+#   * after each update, update_persistence() writes what changed in one transaction.
+# Unchanged data is never written, so most updates cost a single read.
+import asyncio
+import hashlib
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from telegram import Update, User as TelegramUser
+from telegram.ext import BasePersistence, ConversationHandler, ExtBot, PersistenceInput
+
+from app.core.database import SessionLocal
+from app.models.models import BotState
+
+CHAT_DATA = "chat_data"
+USER_DATA = "user_data"
+CONVERSATION = "conversation:"
+BOT_INFO = "bot"
+READ_CACHE_SECONDS = 2.0 # rows prefetched for an update are reused by its refresh calls
+
+StateKey = Tuple[str, str] # (namespace, key)
+
+
+def _key_filter(keys: List[StateKey]):
+    return or_(*[and_(BotState.namespace == namespace, BotState.key == key) for namespace, key in keys])
+
+
+def _load(keys: List[StateKey]) -> Dict[StateKey, str]:
+    if not keys:
+        return {}
+    db = SessionLocal()
+    try:
+        rows = db.query(BotState.namespace, BotState.key, BotState.data).filter(_key_filter(keys)).all()
+        return {(namespace, key): data for namespace, key, data in rows}
+    finally:
+        db.close()
+
+
+def _load_namespace(namespace: str) -> Dict[str, str]:
+    db = SessionLocal()
+    try:
+        return dict(db.query(BotState.key, BotState.data).filter(BotState.namespace == namespace).all())
+    finally:
+        db.close()
+
+
+def _write(items: Dict[StateKey, Optional[str]], retry: bool = True):
+    """Upsert rows (None deletes) in one transaction."""
+    db = SessionLocal()
+    try:
+        existing = {(row.namespace, row.key): row for row in db.query(BotState).filter(_key_filter(list(items))).all()}
+        for (namespace, key), data in items.items():
+            row = existing.get((namespace, key))
+            if data is None:
+                if row:
+                    db.delete(row)
+            elif row:
+                row.data = data
+            else:
+                db.add(BotState(namespace=namespace, key=key, data=data))
+        db.commit()
+    except IntegrityError:
+        # Another instance created one of the rows meanwhile; the second pass updates it
+        db.rollback()
+        if not retry:
+            raise
+        _write(items, retry=False)
+    finally:
+        db.close()
+
+
+def _persistent_conversations(application) -> List[ConversationHandler]:
+    return [
+        handler for group in application.handlers.values() for handler in group
+        if isinstance(handler, ConversationHandler) and handler.persistent and handler.name
+    ]
+
+
+def _conversation_key(handler: ConversationHandler, update: Update) -> Optional[tuple]:
+    """Same key ConversationHandler builds; per-message conversations are not supported."""
+    if handler.per_message:
+        return None
+    key = []
+    if handler.per_chat:
+        if not update.effective_chat:
+            return None
+        key.append(update.effective_chat.id)
+    if handler.per_user:
+        if not update.effective_user:
+            return None
+        key.append(update.effective_user.id)
+    return tuple(key)
+
+
+class DBPersistence(BasePersistence):
+    """
+    chat_data, user_data and ConversationHandler states in the `bot_state` table.
+    `shared=True` is for webhook instances that run side by side (see module comment);
+    polling runs as one process and keeps PTB's usual load-once, write-periodically behaviour.
+    """
+
+    def __init__(self, shared: bool = False, update_interval: float = 60):
+        super().__init__(store_data=PersistenceInput(bot_data=False, callback_data=False), update_interval=update_interval)
+        self.shared = shared
+        self._pending: Dict[StateKey, Optional[str]] = {}
+        self._seen: Dict[StateKey, Optional[str]] = {} # last data read from or written to the table
+        self._prefetched: Dict[StateKey, Tuple[float, Optional[str]]] = {}
+
+    # --- Loading ---
+    def _load_ids(self, namespace: str) -> Dict[int, dict]:
+        if self.shared:
+            return {}
+        rows = _load_namespace(namespace)
+        self._seen.update({(namespace, key): data for key, data in rows.items()})
+        return {int(key): json.loads(data) for key, data in rows.items()}
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return self._load_ids(USER_DATA)
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return self._load_ids(CHAT_DATA)
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[tuple, object]:
+        if self.shared:
+            return {}
+        rows = _load_namespace(CONVERSATION + name)
+        self._seen.update({(CONVERSATION + name, key): data for key, data in rows.items()})
+        return {tuple(json.loads(key)): json.loads(data) for key, data in rows.items()}
+
+    # --- Per-update refresh (shared mode) ---
+    def _read(self, key: StateKey) -> Optional[str]:
+        fetched_at, data = self._prefetched.pop(key, (0.0, None))
+        if time.monotonic() - fetched_at < READ_CACHE_SECONDS:
+            return data
+        return _load([key]).get(key)
+
+    async def load_for_update(self, application, update: Update):
+        """Fetch every row the update may touch in one query, then sync the conversation states."""
+        if not self.shared:
+            return
+        keys = []
+        if update.effective_chat:
+            keys.append((CHAT_DATA, str(update.effective_chat.id)))
+        if update.effective_user:
+            keys.append((USER_DATA, str(update.effective_user.id)))
+        conversations = []
+        for handler in _persistent_conversations(application):
+            key = _conversation_key(handler, update)
+            if key is not None:
+                conversations.append((handler.name, key))
+                keys.append((CONVERSATION + handler.name, json.dumps(list(key))))
+
+        found = _load(keys)
+        now = time.monotonic()
+        # Updates of other chats may be running concurrently, so entries are kept per key;
+        # ones no handler asked for (the update matched nothing) expire here
+        self._prefetched = {
+            key: entry for key, entry in self._prefetched.items() if now - entry[0] < READ_CACHE_SECONDS
+        }
+        self._prefetched.update({
+            key: (now, found.get(key)) for key in keys if not key[0].startswith(CONVERSATION)
+        })
+
+        # ConversationHandler checks its state before any refresh hook runs, so it is set here.
+        # PTB keeps these dicts private; `.data` writes without marking the entry as changed.
+        for name, key in conversations:
+            state_key = (CONVERSATION + name, json.dumps(list(key)))
+            data = found.get(state_key)
+            self._seen[state_key] = data
+            states = application._conversation_handler_conversations.get(name)
+            if states is None:
+                continue
+            if data is None:
+                states.data.pop(key, None)
+            else:
+                states.data[key] = json.loads(data)
+
+    async def _refresh(self, key: StateKey, target: dict):
+        if not self.shared:
+            return
+        data = self._read(key)
+        if key in self._seen and self._seen[key] == data:
+            return
+        target.clear()
+        if data:
+            target.update(json.loads(data))
+        self._seen[key] = data
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        await self._refresh((USER_DATA, str(user_id)), user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        await self._refresh((CHAT_DATA, str(chat_id)), chat_data)
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    # --- Writing ---
+    async def _queue(self, key: StateKey, data: Optional[str]):
+        if (self._seen.get(key) or "{}") == (data or "{}"):
+            return # unchanged; an empty dict and a missing row are the same
+        self._pending[key] = data
+        # update_persistence() gathers one coroutine per changed chat, user and conversation;
+        # yielding once lets all of them queue before the first writes the whole batch
+        await asyncio.sleep(0)
+        self._write_pending()
+
+    def _write_pending(self):
+        items, self._pending = self._pending, {}
+        if items:
+            _write(items)
+            self._seen.update(items)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        await self._queue((USER_DATA, str(user_id)), json.dumps(data, default=str))
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        await self._queue((CHAT_DATA, str(chat_id)), json.dumps(data, default=str))
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        state_key = (CONVERSATION + name, json.dumps(list(key)))
+        await self._queue(state_key, None if new_state is None else json.dumps(new_state))
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self._queue((USER_DATA, str(user_id)), None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await self._queue((CHAT_DATA, str(chat_id)), None)
+
+    async def flush(self) -> None:
+        self._write_pending()
+
+
+class CachedBot(ExtBot):
+    """
+    Answers the getMe call made by initialize() from `bot_state`, so a cold webhook instance
+    does not wait for that round trip. The token is only verified on the first start; a
+    revoked token shows up on the first send instead.
+    """
+
+    def _info_key(self) -> StateKey:
+        return (BOT_INFO, hashlib.sha256(self.token.encode()).hexdigest()[:16])
+
+    async def get_me(self, *args, **kwargs) -> TelegramUser:
+        key = self._info_key()
+        if not args and not kwargs and self._bot_user is None:
+            cached = _load([key]).get(key)
+            if cached:
+                self._bot_user = TelegramUser.de_json(json.loads(cached), self)
+                return self._bot_user
+        me = await super().get_me(*args, **kwargs)
+        _write({key: json.dumps(me.to_dict())})
+        return me
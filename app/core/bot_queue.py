@@ -0,0 +1,196 @@
+# Queue for Telegram webhook updates.
+# The webhook records each update in `telegram_updates` and returns straight away; the
+# primary key on update_id turns Telegram's retries into no-ops. Updates are processed in
+# the background: one drain task per chat keeps a chat's messages in order, and a shared
+# semaphore caps how many updates run at once across chats. Rows left queued or processing
+# by an instance that went away (or a serverless function frozen mid-update) are picked up
+# again by recover_pending() / recover_inline(), which the webhook runs every few minutes.
+import asyncio
+import json
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.models import TelegramUpdate, UpdateStatus
+
+UPDATE_RETENTION_DAYS = 2 # Telegram stops retrying long before this
+RECOVER_INLINE_LIMIT = 10 # stale updates one inline webhook request takes over
+
+_last_recovery = 0.0
+
+
+def update_chat_id(data: dict) -> Optional[str]:
+    """Chat the update belongs to; updates from the same chat are processed in order."""
+    for key in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        chat = (data.get(key) or {}).get("chat")
+        if chat and chat.get("id") is not None:
+            return str(chat["id"])
+    callback = data.get("callback_query")
+    if callback:
+        chat = (callback.get("message") or {}).get("chat")
+        if chat and chat.get("id") is not None:
+            return str(chat["id"])
+    for key in ("callback_query", "inline_query", "my_chat_member"):
+        sender = (data.get(key) or {}).get("from")
+        if sender and sender.get("id") is not None:
+            return str(sender["id"])
+    return None
+
+
+def record_update(update_id: int, data: dict) -> bool:
+    """Store the update. False if it was already received (a retry)."""
+    db = SessionLocal()
+    try:
+        db.add(TelegramUpdate(
+            update_id=update_id,
+            chat_id=update_chat_id(data),
+            payload=json.dumps(data),
+            status=UpdateStatus.QUEUED
+        ))
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
+def _stale_cutoff():
+    return datetime.now(timezone.utc) - timedelta(seconds=settings.BOT_UPDATE_STALE_SECONDS)
+
+
+def _claim(update_id: int) -> bool:
+    """Mark the update as processing unless it is done or another worker is on it."""
+    db = SessionLocal()
+    try:
+        # Staleness counts from when processing started, so a long wait in the queue
+        # does not let a second worker take over an update that is still running
+        claimed = db.query(TelegramUpdate).filter(
+            TelegramUpdate.update_id == update_id,
+            (TelegramUpdate.status == UpdateStatus.QUEUED) | (
+                (TelegramUpdate.status == UpdateStatus.PROCESSING) & (TelegramUpdate.started_at < _stale_cutoff())
+            )
+        ).update({"status": UpdateStatus.PROCESSING, "started_at": datetime.now(timezone.utc)}, synchronize_session=False)
+        db.commit()
+        return claimed == 1
+    finally:
+        db.close()
+
+
+def _finish(update_id: int, error: Optional[str] = None):
+    db = SessionLocal()
+    try:
+        # The payload is only kept for recovery; once the update has run it is dropped, as it
+        # may hold message text such as the password sent during /link
+        db.query(TelegramUpdate).filter(TelegramUpdate.update_id == update_id).update({
+            "status": UpdateStatus.FAILED if error else UpdateStatus.DONE,
+            "payload": None,
+            "error": error,
+            "processed_at": datetime.now(timezone.utc)
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def process_recorded(application, update_id: int, data: dict):
+    """Run one recorded update through the bot and store the outcome."""
+    from app.core.telegram_bot import process_webhook_update
+
+    if not _claim(update_id):
+        return
+    try:
+        await process_webhook_update(application, data)
+        _finish(update_id)
+    except Exception as e:
+        print(f"Telegram update {update_id} failed: {e}")
+        _finish(update_id, error=str(e))
+
+
+class UpdateQueue:
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self._pending: Dict[str, Deque[Tuple[int, dict]]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._slots: Optional[asyncio.Semaphore] = None # created inside the running loop
+
+    def submit(self, application, update_id: int, data: dict):
+        key = update_chat_id(data) or f"update:{update_id}"
+        self._pending.setdefault(key, deque()).append((update_id, data))
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._drain(application, key))
+
+    async def _drain(self, application, key: str):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        try:
+            while self._pending.get(key):
+                update_id, data = self._pending[key].popleft()
+                async with self._slots:
+                    await process_recorded(application, update_id, data)
+        finally:
+            self._pending.pop(key, None)
+            self._workers.pop(key, None)
+
+    def size(self) -> int:
+        return sum(len(items) for items in self._pending.values())
+
+    async def join(self):
+        """Wait until everything submitted so far has been processed."""
+        while self._workers:
+            await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
+
+
+update_queue = UpdateQueue(settings.BOT_WORKER_CONCURRENCY)
+
+
+def recovery_due() -> bool:
+    """True at most once per BOT_UPDATE_STALE_SECONDS in this process (the first call included)."""
+    global _last_recovery
+    now = time.monotonic()
+    if _last_recovery and now - _last_recovery < settings.BOT_UPDATE_STALE_SECONDS:
+        return False
+    _last_recovery = now
+    return True
+
+
+def stale_updates(limit: Optional[int] = None) -> List[Tuple[int, dict]]:
+    """Updates still queued, or processing, past BOT_UPDATE_STALE_SECONDS; also prunes old rows."""
+    cutoff = _stale_cutoff()
+    db = SessionLocal()
+    try:
+        query = db.query(TelegramUpdate.update_id, TelegramUpdate.payload).filter(
+            ((TelegramUpdate.status == UpdateStatus.QUEUED) & (TelegramUpdate.received_at < cutoff)) |
+            ((TelegramUpdate.status == UpdateStatus.PROCESSING) & (TelegramUpdate.started_at < cutoff))
+        ).order_by(TelegramUpdate.update_id)
+        rows = query.limit(limit).all() if limit else query.all()
+        db.query(TelegramUpdate).filter(
+            TelegramUpdate.status.in_([UpdateStatus.DONE, UpdateStatus.FAILED]),
+            TelegramUpdate.received_at < datetime.now(timezone.utc) - timedelta(days=UPDATE_RETENTION_DAYS)
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    return [(update_id, json.loads(payload or "{}")) for update_id, payload in rows]
+
+
+def recover_pending(application) -> int:
+    """Re-submit abandoned updates to the background queue. Returns updates re-submitted."""
+    rows = stale_updates()
+    for update_id, data in rows:
+        update_queue.submit(application, update_id, data)
+    return len(rows)
+
+
+async def recover_inline(application, limit: int = RECOVER_INLINE_LIMIT) -> int:
+    """Process abandoned updates within the current request (serverless, inline mode)."""
+    rows = stale_updates(limit)
+    for update_id, data in rows:
+        await process_recorded(application, update_id, data)
+    return len(rows)
@@ -2,13 +2,59 @@ from sqlalchemy.orm import Session
 from app.models.models import User, Job, JobStatus, JobHistory, Assignment, Project
 from app.core.security import verify_password, get_password_hash
 from app.core.database import SessionLocal
+from app.core.cache import ResultCache, create_backend, invalidate_reports
+from app.core.config import settings
+from app.core.project_stats import project_job_counts
+from app.core.routing import plan_route, technician_jobs_query
+from app.core.visibility import assigned_clause, can_access_job, scope_jobs
 from datetime import date, datetime, timedelta
 from sqlalchemy import or_, and_, desc
 from sqlalchemy.orm import joinedload
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+PROJECT_JOB_LIST_LIMIT = 15
 
 def get_db_session():
     return SessionLocal()
 
+@dataclass(frozen=True)
+class BotUser:
+    """The user fields the bot needs, detached from any session so it can be cached."""
+    id: int
+    username: str
+    full_name: Optional[str]
+    role: str
+    team_id: Optional[int]
+    telegram_id: Optional[str]
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "BotUser":
+        return cls(
+            id=user.id,
+            username=user.username,
+            full_name=user.full_name,
+            role=str(user.role.value if hasattr(user.role, 'value') else user.role),
+            team_id=user.team_id,
+            telegram_id=user.telegram_id,
+            is_active=bool(user.is_active)
+        )
+
+# chat id -> BotUser fields (or None for unlinked chats). Entries are plain dicts so the
+# cache can follow CACHE_BACKEND: with redis, the API's invalidations reach every bot process;
+# with the memory backend they only reach the API's own process and the short TTL bounds the rest.
+bot_user_cache = ResultCache(
+    "bot_users",
+    ttl=settings.BOT_USER_CACHE_TTL,
+    backend=create_backend(max_entries=settings.BOT_USER_CACHE_SIZE)
+)
+
+def invalidate_bot_users(*telegram_ids):
+    for telegram_id in telegram_ids:
+        if telegram_id:
+            bot_user_cache.delete("chat", {"chat_id": str(telegram_id)})
+
 class BotService:
     @staticmethod
     def verify_user_login(username, password):
@@ -20,6 +66,8 @@ class BotService:
                 return None
             if not verify_password(password, user.password_hash):
                 return None
+            if not user.is_active:
+                return None
             return user
         finally:
             db.close()
@@ -31,21 +79,56 @@ class BotService:
         try:
             user = db.query(User).filter(User.username == username).first()
             if user:
+                old_telegram_id = user.telegram_id
                 user.telegram_id = str(telegram_id)
                 db.add(user)
                 db.commit()
                 db.refresh(user)
+                invalidate_bot_users(old_telegram_id, telegram_id)
                 return True
             return False
         finally:
             db.close()
 
+    @staticmethod
+    def unlink_telegram_id(telegram_id):
+        """Disconnect whichever account is linked to this chat."""
+        db = get_db_session()
+        try:
+            user = db.query(User).filter(User.telegram_id == str(telegram_id)).first()
+            if user:
+                user.telegram_id = None
+                db.add(user)
+                db.commit()
+            invalidate_bot_users(telegram_id)
+            return user is not None
+        finally:
+            db.close()
+
     @staticmethod
     def get_user_by_telegram_id(telegram_id):
-        """Get user by telegram_id."""
+        """Get user by telegram_id (cached snapshot, None if the chat is not linked or the account is deactivated)."""
+        def load():
+            db = get_db_session()
+            try:
+                user = db.query(User).filter(User.telegram_id == str(telegram_id)).first()
+                return asdict(BotUser.from_user(user)) if user else None
+            finally:
+                db.close()
+        data = bot_user_cache.get_or_compute("chat", load, params={"chat_id": str(telegram_id)})
+        if not data or not data["is_active"]:
+            return None
+        return BotUser(**data)
+
+    @staticmethod
+    def warm_user_cache():
+        """Preload every linked account so the first messages after a start hit the cache."""
         db = get_db_session()
         try:
-            return db.query(User).filter(User.telegram_id == str(telegram_id)).first()
+            users = db.query(User).filter(User.telegram_id.isnot(None)).all()
+            for user in users:
+                bot_user_cache.set("chat", asdict(BotUser.from_user(user)), params={"chat_id": str(user.telegram_id)})
+            return len(users)
         finally:
             db.close()
 
@@ -65,9 +148,23 @@ class BotService:
             db.close()
 
     @staticmethod
-    def get_jobs(user_id, filters=None):
+    def get_route(user_id, day=None):
+        """A technician's jobs for one day in travel-optimized order, with route totals."""
+        db = get_db_session()
+        try:
+            day = day or date.today()
+            jobs = technician_jobs_query(db, user_id, day).options(
+                joinedload(Job.assignments).joinedload(Assignment.technician)
+            ).all()
+            return plan_route(jobs, day)
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_jobs(user_id, filters=None, limit=None, offset=0):
         """
         Get jobs based on filters and user role.
+        With `limit`, returns one page (listings must fit in a Telegram message).
         """
         db = get_db_session()
         try:
@@ -86,7 +183,7 @@ class BotService:
                     # Find technician by name (partial match)
                     tech = db.query(User).filter(User.full_name.ilike(f"%{tech_name}%") | User.username.ilike(f"%{tech_name}%")).first()
                     if tech:
-                        query = query.join(Assignment).filter(Assignment.technician_id == tech.id)
+                        query = query.filter(assigned_clause(db, tech.id))
                     else:
                         return [] # Tech not found
                 else:
@@ -95,8 +192,8 @@ class BotService:
                     # Let's default to ALL jobs if no tech specified for Admin.
                     pass 
             else:
-                # Regular staff/technician -> Only own jobs
-                query = query.join(Assignment).filter(Assignment.technician_id == user.id)
+                # Regular staff/technician -> Only own jobs (direct or team assignments)
+                query = query.filter(assigned_clause(db, user.id))
 
             if filters:
                 # Date Filter
@@ -158,8 +255,10 @@ class BotService:
                         )
                     )
 
-            # Order by date
-            query = query.order_by(Job.scheduled_date.asc(), Job.scheduled_time.asc())
+            # Order by date (id last so pages are stable)
+            query = query.order_by(Job.scheduled_date.asc(), Job.scheduled_time.asc(), Job.id.asc())
+            if limit is not None:
+                query = query.offset(offset).limit(limit)
             
             # Eager load assignments and technicians to prevent DetachedInstanceError
             # when accessing job.assignments in the bot (after session closed)
@@ -171,6 +270,12 @@ class BotService:
         finally:
             db.close()
 
+    @staticmethod
+    def get_jobs_page(user_id, filters=None, page=0, page_size=8):
+        """One page of get_jobs plus whether another page follows."""
+        jobs = BotService.get_jobs(user_id, filters, limit=page_size + 1, offset=page * page_size)
+        return {"jobs": jobs[:page_size], "page": page, "has_more": len(jobs) > page_size}
+
     @staticmethod
     def get_projects(filters=None):
         """
@@ -209,17 +314,18 @@ class BotService:
             if not project:
                 return None
 
-            # Calculate stats
-            total_jobs = len(project.jobs)
-            completed_jobs = sum(1 for j in project.jobs if j.status == JobStatus.COMPLETED)
-            progress = int((completed_jobs / total_jobs * 100) if total_jobs > 0 else 0)
-            
+            # Aggregate in SQL instead of loading every job of the project
+            counts = project_job_counts(db, project.id)
+
             # Format dates
             start_date = project.start_date.strftime("%d/%m/%Y") if project.start_date else "-"
             end_date = project.end_date.strftime("%d/%m/%Y") if project.end_date else "-"
 
-            # Collect Job Titles
-            job_list = [f"{j.title} ({j.status})" for j in project.jobs]
+            # Only the first jobs: big projects would exceed Telegram's message limit
+            jobs = db.query(Job.title, Job.status).filter(
+                Job.project_id == project.id
+            ).order_by(Job.scheduled_date.asc(), Job.id.asc()).limit(PROJECT_JOB_LIST_LIMIT).all()
+            job_list = [f"{title} ({status})" for title, status in jobs]
 
             return {
                 "id": project.id,
@@ -227,11 +333,13 @@ class BotService:
                 "customer": project.customer_name,
                 "description": project.description,
                 "status": project.status,
-                "progress": progress,
-                "total_jobs": total_jobs,
+                "progress": counts["progress"],
+                "total_jobs": counts["total_jobs"],
+                "completed_jobs": counts["completed_jobs"],
                 "start_date": start_date,
                 "end_date": end_date,
-                "job_list": job_list
+                "job_list": job_list,
+                "more_jobs": max(counts["total_jobs"] - len(job_list), 0)
             }
         finally:
             db.close()
@@ -241,39 +349,51 @@ class BotService:
         """Get full details of a specific job (Security Check included)."""
         db = get_db_session()
         try:
-            # Check assignment first
-            query = db.query(Job).join(Assignment).filter(
-                Assignment.technician_id == user_id,
-                Job.id == job_id
-            ).options(
+            user = db.query(User).filter(User.id == user_id).first()
+            if not user:
+                return None
+            # Same visibility rule as the API
+            query = scope_jobs(db.query(Job).filter(Job.id == job_id), db, user).options(
                 joinedload(Job.assignments).joinedload(Assignment.technician)
             )
-            job = query.first()
-            return job
+            return query.first()
         finally:
             db.close()
 
     @staticmethod
-    def update_job_status(job_id, user_id, new_status, note=None):
-        """Update job status and add log."""
+    def update_job_status(job_id, user_id, new_status, note=None, expected_status=None):
+        """
+        Update job status and add log.
+        `expected_status` is the status the user saw (e.g. on a button); if the job has
+        moved on since, nothing is written. A request with only a note is logged as a note.
+        """
+        if not new_status:
+            if note:
+                return BotService.add_job_note(job_id, user_id, note)
+            return False, "No new status or note given"
+        if new_status not in [s.value for s in JobStatus]:
+            return False, f"Unknown status: {new_status}"
         db = get_db_session()
         try:
             job = db.query(Job).filter(Job.id == job_id).first()
             if not job:
                 return False, "Job not found"
 
-            # Check permissions (simple check via assignments)
-            is_assigned = db.query(Assignment).filter(
-                Assignment.job_id == job_id, 
-                Assignment.technician_id == user_id
-            ).first()
-            
-            if not is_assigned:
+            # Check permissions (same rule as the API)
+            user = db.query(User).filter(User.id == user_id).first()
+            if not user or not can_access_job(db, user, job_id):
                 return False, "Not authorized"
 
-            old_status = job.status
-            job.status = new_status
-            
+            # Conditional write: of two taps (or two instances) only one finds the old status
+            old_status = expected_status if expected_status is not None else job.status
+            updated = db.query(Job).filter(Job.id == job_id, Job.status == old_status).update(
+                {"status": new_status}, synchronize_session=False
+            )
+            if not updated:
+                db.rollback()
+                current = db.query(Job.status).filter(Job.id == job_id).scalar()
+                return False, f"Job is already {current}"
+
             # Add History
             history = JobHistory(
                 job_id=job.id,
@@ -284,6 +404,32 @@ class BotService:
             )
             db.add(history)
             db.commit()
+            invalidate_reports()
             return True, "Updated successfully"
         finally:
             db.close()
+
+    @staticmethod
+    def add_job_note(job_id, user_id, note):
+        """Log a note on the job without changing its status."""
+        db = get_db_session()
+        try:
+            job = db.query(Job).filter(Job.id == job_id).first()
+            if not job:
+                return False, "Job not found"
+
+            user = db.query(User).filter(User.id == user_id).first()
+            if not user or not can_access_job(db, user, job_id):
+                return False, "Not authorized"
+
+            db.add(JobHistory(
+                job_id=job.id,
+                user_id=user_id,
+                old_status=job.status,
+                new_status=job.status,
+                note=note
+            ))
+            db.commit()
+            return True, "Note added"
+        finally:
+            db.close()
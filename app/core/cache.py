@@ -0,0 +1,211 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+
+_MISSING = object()
+
+
+class MemoryBackend:
+    """In-process backend: a dict with per-key expiry and an optional LRU bound."""
+
+    PURGE_INTERVAL = 60 # seconds between sweeps for expired entries
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._purged_at = time.monotonic()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            expires_at, value = item
+            if expires_at and expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        now = time.monotonic()
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            # Expired entries are otherwise only dropped when their own key is read again
+            if now - self._purged_at >= self.PURGE_INTERVAL:
+                self._purged_at = now
+                for stale in [k for k, (at, _) in self._data.items() if at and at < now]:
+                    del self._data[stale]
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            if self.max_entries:
+                while len(self._data) > self.max_entries:
+                    self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_prefix(self, prefix: str):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+
+class RedisBackend:
+    """Shared backend so every instance sees the same entries and invalidations."""
+
+    def __init__(self, url: str):
+        import redis  # Optional dependency, only needed when CACHE_BACKEND=redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        raw = self.client.get(key)
+        if raw is None:
+            return _MISSING
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        self.client.set(key, json.dumps(value, default=str), ex=ttl or None)
+
+    def delete(self, key: str):
+        self.client.delete(key)
+
+    def delete_prefix(self, prefix: str):
+        keys = list(self.client.scan_iter(match=f"{prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+def create_backend(max_entries: Optional[int] = None, backend: Optional[str] = None):
+    """
+    Pick the backend (`backend`, else CACHE_BACKEND), falling back to memory if Redis is unavailable.
+    `max_entries` bounds the memory backend.
+    """
+    if (backend or settings.CACHE_BACKEND) == "redis" and settings.REDIS_URL:
+        try:
+            return RedisBackend(settings.REDIS_URL)
+        except Exception as e:
+            print(f"Redis cache unavailable, using memory backend: {e}")
+    return MemoryBackend(max_entries=max_entries)
+
+
+# Every ResultCache registers itself here so one endpoint can report on all of them
+CACHES: Dict[str, "ResultCache"] = {}
+
+
+class ResultCache:
+    """
+    Namespaced result cache with TTL, explicit invalidation and hit/miss counters.
+    Keys are built from a name, the call parameters and a scope (e.g. the caller's role).
+    """
+
+    def __init__(self, namespace: str, ttl: int = 60, backend=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.backend = backend or create_backend()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        CACHES[namespace] = self
+
+    def make_key(self, name: str, params: Optional[Dict] = None, scope: str = "all") -> str:
+        params_str = json.dumps(params or {}, sort_keys=True, default=str)
+        return f"{self.namespace}:{name}:{scope}:{params_str}"
+
+    def get_or_compute(self, name: str, compute: Callable[[], Any], params: Optional[Dict] = None, scope: str = "all", ttl: Optional[int] = None):
+        key = self.make_key(name, params, scope)
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Cache read failed ({key}): {e}")
+            value = _MISSING
+
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = compute()
+        try:
+            self.backend.set(key, value, ttl or self.ttl)
+        except Exception as e:
+            print(f"Cache write failed ({key}): {e}")
+        return value
+
+    def get(self, name: str, params: Optional[Dict] = None, scope: str = "all", default: Any = None):
+        """Look up an entry without computing it, for values that are only cached conditionally."""
+        key = self.make_key(name, params, scope)
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Cache read failed ({key}): {e}")
+            value = _MISSING
+
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, name: str, value: Any, params: Optional[Dict] = None, scope: str = "all", ttl: Optional[int] = None):
+        """Store a value directly, e.g. when warming the cache."""
+        key = self.make_key(name, params, scope)
+        try:
+            self.backend.set(key, value, ttl or self.ttl)
+        except Exception as e:
+            print(f"Cache write failed ({key}): {e}")
+
+    def delete(self, name: str, params: Optional[Dict] = None, scope: str = "all"):
+        """Drop a single entry."""
+        key = self.make_key(name, params, scope)
+        try:
+            self.backend.delete(key)
+        except Exception as e:
+            print(f"Cache delete failed ({key}): {e}")
+        self.invalidations += 1
+
+    def invalidate(self, name: Optional[str] = None):
+        """Drop every entry of this namespace (or only those of one name)."""
+        prefix = f"{self.namespace}:{name}:" if name else f"{self.namespace}:"
+        try:
+            self.backend.delete_prefix(prefix)
+        except Exception as e:
+            print(f"Cache invalidation failed ({prefix}): {e}")
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+report_cache = ResultCache(
+    "reports",
+    ttl=settings.REPORT_CACHE_TTL,
+    backend=create_backend(max_entries=settings.REPORT_CACHE_SIZE)
+)
+
+
+def report_scope(user) -> str:
+    """Cache scope for a report request: admins/staff share entries, technicians get their own."""
+    role = str(user.role.value if hasattr(user.role, 'value') else user.role).lower()
+    if role == "technician":
+        return f"technician:{user.id}"
+    return role
+
+
+def invalidate_reports():
+    """Called after any job write (API or bot) so reports never serve stale numbers past a change."""
+    report_cache.invalidate()
@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -16,11 +17,63 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # Database pool: 0 keeps NullPool (serverless); long-running processes (serve.py) reuse connections
+    DB_POOL_SIZE: int = 0
+    DB_MAX_OVERFLOW: int = 10
+
+    # Supervisor (serve.py): API, bot and scheduled tasks in one process per worker
+    SERVE_HOST: str = "0.0.0.0"
+    SERVE_PORT: int = 8000
+    SERVE_WORKERS: int = 1 # API processes; the first also runs polling and the scheduler
+    BOT_MODE: str = "polling" # polling, webhook, off
+
     # Telegram
     TELEGRAM_BOT_TOKEN: str = "YOUR_BOT_TOKEN_HERE"
+    TELEGRAM_WEBHOOK_SECRET: Optional[str] = None # secret_token passed to setWebhook
+    # Acknowledge webhooks first, process in the background. Off on Vercel (it sets VERCEL=1),
+    # where the function may be frozen as soon as the response is sent
+    BOT_WEBHOOK_ASYNC: bool = not os.getenv("VERCEL")
+    BOT_WORKER_CONCURRENCY: int = 4 # Updates processed at once across chats
+    BOT_UPDATE_STALE_SECONDS: int = 120 # Re-run an update left unfinished by a stopped instance
+
+    # Morning digest
+    BOT_DIGEST_TIME: str = "07:30" # Local time the daily digest goes out
+    BOT_BROADCAST_RATE: float = 25 # Messages per second across all chats (Telegram allows ~30)
+    BOT_CHAT_MIN_INTERVAL: float = 1.0 # Seconds between messages to the same chat
+    BOT_SEND_MAX_ATTEMPTS: int = 4
     
     # AI
     GOOGLE_API_KEY: str = "YOUR_GOOGLE_API_KEY_HERE"
+    AI_INTENT_CACHE_BACKEND: str = "memory" # memory, redis (shared across instances and restarts)
+    AI_INTENT_CACHE_TTL: int = 21600 # seconds; entries are also keyed by the current date
+    AI_INTENT_CACHE_SIZE: int = 2000 # LRU bound of the memory backend
+    AI_TIMEOUT_SECONDS: float = 10 # deadline for one message, retries included
+    AI_MAX_RETRIES: int = 2 # on rate limits and server errors
+    AI_MAX_CONCURRENCY: int = 4 # model calls in flight per process
+    AI_BREAKER_FAILURES: int = 5 # consecutive failed messages before the rules answer alone
+    AI_BREAKER_COOLDOWN: int = 60 # seconds before the model is tried again
+
+    # Cache
+    CACHE_BACKEND: str = "memory" # memory, redis
+    REDIS_URL: Optional[str] = None
+    REPORT_CACHE_TTL: int = 60 # seconds
+    REPORT_CACHE_SIZE: int = 1000 # LRU bound of the memory backend
+    VISIBILITY_CACHE_TTL: int = 300 # user -> team ids used for technician job scoping
+    VISIBILITY_CACHE_SIZE: int = 5000
+    BOT_USER_CACHE_TTL: int = 60 # Telegram chat id -> user snapshot (shared when CACHE_BACKEND=redis)
+    BOT_USER_CACHE_SIZE: int = 5000
+
+    # Background Exports
+    EXPORT_DIR: str = "/tmp/pimtong_exports" # Local storage for finished files (writable on Vercel)
+    EXPORT_MAX_CONCURRENCY: int = 2 # Running exports across all instances
+    EXPORT_STALE_SECONDS: int = 300 # Re-queue a running export if its worker stops reporting
+
+    # Bulk User Import
+    USER_IMPORT_WORKERS: int = 4 # Processes used to hash passwords
+    USER_IMPORT_MAX_ROWS: int = 5000
+
+    # Dispatch
+    DISPATCH_MAX_JOBS_PER_DAY: int = 6 # Capacity per technician used by auto-dispatch
 
     class Config:
         env_file = ".env"
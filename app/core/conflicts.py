@@ -0,0 +1,111 @@
+# Double-booking detection.
+# A job with a clock time ("14:00") occupies [time, time + SERVICE_MINUTES). Jobs booked for
+# a named slot ("Morning") or with no time are flexible and never flagged on their own.
+# Candidates come from one query on (scheduled_date, assignee), both indexed, so the check on
+# the write path only reads the few jobs booked for the same technicians that day.
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.routing import SERVICE_MINUTES, clock_time
+from app.core.workload import assignee_join_condition
+from app.models.models import Assignment, Job, JobStatus, User
+
+
+def job_interval(scheduled_time: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Occupied minutes after midnight, or None for flexible bookings."""
+    start = clock_time(scheduled_time)
+    if start is None:
+        return None # named slot or anytime
+    return (start, start + SERVICE_MINUTES)
+
+
+def _booked_rows(db: Session, start: date, end: date, user_ids: Optional[List[int]] = None, exclude_job_id: Optional[int] = None):
+    query = db.query(
+        User.id, User.full_name, Job.id, Job.title, Job.scheduled_date, Job.scheduled_time
+    ).select_from(Assignment).join(
+        Job, Job.id == Assignment.job_id
+    ).join(
+        User, assignee_join_condition()
+    ).filter(
+        Job.scheduled_date >= start,
+        Job.scheduled_date <= end,
+        Job.scheduled_time.isnot(None),
+        Job.status != JobStatus.CANCELLED
+    )
+    if user_ids is not None:
+        query = query.filter(User.id.in_(user_ids))
+    if exclude_job_id is not None:
+        query = query.filter(Job.id != exclude_job_id)
+    return query.distinct().all()
+
+
+def job_assignee_ids(db: Session, job_id: int) -> List[int]:
+    """Everyone a job is booked for: direct assignees and the members of assigned teams."""
+    rows = db.query(User.id).select_from(Assignment).join(
+        User, assignee_join_condition()
+    ).filter(Assignment.job_id == job_id).distinct().all()
+    return [user_id for (user_id,) in rows]
+
+
+def _conflict(user_id, user_name, day, a, b) -> Dict:
+    return {
+        "technician_id": user_id,
+        "technician_name": user_name,
+        "date": day,
+        "job_id": a["id"],
+        "job_title": a["title"],
+        "scheduled_time": a["time"],
+        "conflicting_job_id": b["id"],
+        "conflicting_job_title": b["title"],
+        "conflicting_scheduled_time": b["time"],
+    }
+
+
+def find_conflicts_for(
+    db: Session,
+    technician_ids: List[int],
+    day: Optional[date],
+    scheduled_time: Optional[str],
+    job_id: Optional[int] = None,
+    title: Optional[str] = None
+) -> List[Dict]:
+    """Existing bookings that overlap a proposed job for any of `technician_ids`."""
+    interval = job_interval(scheduled_time)
+    if not technician_ids or not day or interval is None:
+        return []
+    proposed = {"id": job_id, "title": title, "time": scheduled_time}
+    conflicts = []
+    for user_id, user_name, other_id, other_title, other_day, other_time in _booked_rows(
+        db, day, day, user_ids=technician_ids, exclude_job_id=job_id
+    ):
+        other = job_interval(other_time)
+        if other and other[0] < interval[1] and interval[0] < other[1]:
+            conflicts.append(_conflict(user_id, user_name, day, proposed, {"id": other_id, "title": other_title, "time": other_time}))
+    return conflicts
+
+
+def scan_conflicts(db: Session, start: date, end: date, technician_id: Optional[int] = None) -> List[Dict]:
+    """Every overlapping pair of bookings in [start, end], per technician and day (sweep line)."""
+    booked = defaultdict(list)
+    names = {}
+    for user_id, user_name, job_id, title, day, time in _booked_rows(
+        db, start, end, user_ids=[technician_id] if technician_id else None
+    ):
+        interval = job_interval(time)
+        if interval:
+            names[user_id] = user_name
+            booked[(user_id, day)].append((interval, {"id": job_id, "title": title, "time": time}))
+
+    conflicts = []
+    for (user_id, day), items in sorted(booked.items(), key=lambda kv: (kv[0][1], kv[0][0])):
+        items.sort(key=lambda item: item[0])
+        active = [] # bookings still running at the current start time
+        for interval, job in items:
+            active = [(i, j) for i, j in active if i[1] > interval[0]]
+            for _, other in active:
+                conflicts.append(_conflict(user_id, names[user_id], day, other, job))
+            active.append((interval, job))
+    return conflicts
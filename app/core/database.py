@@ -7,12 +7,22 @@ from sqlalchemy.pool import NullPool
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-# Use NullPool for serverless compatibility (Vercel) to prevent stale connections
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    pool_pre_ping=True, 
-    poolclass=NullPool
-)
+if settings.DB_POOL_SIZE > 0:
+    # Long-running process (serve.py): API, bot and scheduler share pooled connections
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        pool_pre_ping=True,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_recycle=1800
+    )
+else:
+    # Use NullPool for serverless compatibility (Vercel) to prevent stale connections
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL, 
+        pool_pre_ping=True, 
+        poolclass=NullPool
+    )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -0,0 +1,261 @@
+# Morning digest: every linked technician gets their day pushed to Telegram.
+# The day is loaded for all technicians in one query (assignments joined to users, grouped
+# in Python) and ordered with the same route planner as /today. Messages go out through a
+# RateLimiter that keeps under Telegram's global and per-chat limits; flood control
+# (RetryAfter) pauses every sender, network errors are retried with backoff, and each
+# outcome is stored in `digest_deliveries` so a re-run only sends what is still missing.
+# A run claims its rows (status "sending" plus its claim id) in one UPDATE before sending,
+# so overlapping runs (scheduler and POST /api/reports/digest) never message anyone twice.
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from html import escape
+from typing import Dict, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.routing import plan_route
+from app.core.workload import assignee_join_condition
+from app.models.models import Assignment, DeliveryStatus, DigestDelivery, Job, JobStatus, User, UserRole
+
+DIGEST_MAX_LINES = 30 # keeps the message well under Telegram's 4096 characters
+BACKOFF_SECONDS = 2.0 # doubled after every failed attempt
+CLAIM_STALE_SECONDS = 1800 # a run that stopped mid-send; its rows may be claimed again
+
+
+class RateLimiter:
+    """Spaces sends to `rate` per second overall and one per `chat_interval` seconds per chat."""
+
+    def __init__(self, rate: float, chat_interval: float):
+        self.interval = 1.0 / rate
+        self.chat_interval = chat_interval
+        self._next_send = 0.0
+        self._next_chat: Dict[str, float] = {}
+        self._lock = None # created inside the running loop
+
+    async def wait(self, chat_id: str):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            slot = max(now, self._next_send, self._next_chat.get(chat_id, 0.0))
+            self._next_send = slot + self.interval
+            self._next_chat[chat_id] = slot + self.chat_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds: float):
+        """Flood control applies to the whole bot, so every sender waits."""
+        now = asyncio.get_running_loop().time()
+        self._next_send = max(self._next_send, now + seconds)
+
+
+def technician_days(db: Session, day: date) -> List[Dict]:
+    """Every active, linked technician with jobs on `day`, in one query."""
+    rows = db.query(User.id, User.full_name, User.telegram_id, Job).select_from(Assignment).join(
+        Job, Job.id == Assignment.job_id
+    ).join(
+        User, assignee_join_condition()
+    ).filter(
+        Job.scheduled_date == day,
+        Job.status != JobStatus.CANCELLED,
+        User.role == UserRole.TECHNICIAN,
+        User.is_active == True,
+        User.telegram_id.isnot(None),
+        User.telegram_id != ""
+    ).options(
+        joinedload(Job.assignments).joinedload(Assignment.technician)
+    ).order_by(User.id, Job.scheduled_time, Job.id).all()
+
+    days = OrderedDict()
+    for user_id, full_name, telegram_id, job in rows:
+        entry = days.setdefault(user_id, {"user_id": user_id, "full_name": full_name, "chat_id": telegram_id, "jobs": {}})
+        entry["jobs"][job.id] = job # a job assigned directly and through the team appears twice
+    return [dict(entry, jobs=list(entry["jobs"].values())) for entry in days.values()]
+
+
+def format_digest(full_name: Optional[str], day: date, jobs: List[Job]) -> str:
+    route = plan_route(jobs, day)
+    lines = [
+        f"☀️ <b>Good morning, {escape(full_name or '')}!</b>",
+        f"You have {len(jobs)} job(s) on {day.strftime('%d/%m/%Y')}.",
+    ]
+    if route["stops"]:
+        lines.append(f"🛣️ <b>Route:</b> {route['distance_km']} km")
+    lines.append("")
+    ordered = route["ordered"]
+    for index, job in enumerate(ordered[:DIGEST_MAX_LINES], start=1):
+        line = f"{index}. {escape(job.scheduled_time or 'Anytime')} · <b>#{job.id}</b> {escape(job.title or '')} · {escape(job.customer_name or '-')}"
+        if job.location_lat and job.location_long:
+            line += f" · <a href='https://www.google.com/maps/search/?api=1&query={job.location_lat},{job.location_long}'>📍</a>"
+        lines.append(line)
+    if len(ordered) > DIGEST_MAX_LINES:
+        lines.append(f"…and {len(ordered) - DIGEST_MAX_LINES} more.")
+    lines.append("")
+    lines.append("Send /today for full details.")
+    return "\n".join(lines)
+
+
+def _seconds(retry_after) -> float:
+    return retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after)
+
+
+async def send_with_retry(bot: Bot, limiter: RateLimiter, chat_id: str, text: str, max_attempts: Optional[int] = None):
+    """Returns (status, attempts, error)."""
+    max_attempts = max_attempts or settings.BOT_SEND_MAX_ATTEMPTS
+    error = None
+    for attempt in range(1, max_attempts + 1):
+        await limiter.wait(chat_id)
+        try:
+            await bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML", disable_web_page_preview=True)
+            return DeliveryStatus.SENT, attempt, None
+        except RetryAfter as e:
+            error = str(e)
+            limiter.pause(_seconds(e.retry_after))
+        except Forbidden as e:
+            return DeliveryStatus.BLOCKED, attempt, str(e)
+        except BadRequest as e:
+            if "chat not found" in str(e).lower():
+                return DeliveryStatus.BLOCKED, attempt, str(e)
+            return DeliveryStatus.FAILED, attempt, str(e)
+        except NetworkError as e: # includes TimedOut
+            error = str(e)
+            await asyncio.sleep(BACKOFF_SECONDS * 2 ** (attempt - 1))
+    return DeliveryStatus.FAILED, max_attempts, error
+
+
+def _prepare_deliveries(db: Session, day: date, technicians: List[Dict], claim_id: str) -> List[Dict]:
+    """
+    Claim the deliveries this run should send; technicians already sent (or unreachable)
+    today, or being sent by another run, are skipped.
+    """
+    by_user = {tech["user_id"]: tech for tech in technicians}
+    if not by_user:
+        return []
+    existing = {
+        user_id for (user_id,) in db.query(DigestDelivery.user_id).filter(DigestDelivery.day == day).all()
+    }
+    for user_id in by_user.keys() - existing:
+        try:
+            with db.begin_nested():
+                db.add(DigestDelivery(day=day, user_id=user_id, status=DeliveryStatus.PENDING))
+        except IntegrityError:
+            pass # another run created it meanwhile
+    db.commit()
+
+    now = datetime.now(timezone.utc)
+    db.query(DigestDelivery).filter(
+        DigestDelivery.day == day,
+        DigestDelivery.user_id.in_(list(by_user)),
+        or_(
+            DigestDelivery.status.in_([DeliveryStatus.PENDING, DeliveryStatus.FAILED]),
+            (DigestDelivery.status == DeliveryStatus.SENDING) &
+            (DigestDelivery.claimed_at < now - timedelta(seconds=CLAIM_STALE_SECONDS)),
+        )
+    ).update({
+        "status": DeliveryStatus.SENDING, "claim_id": claim_id, "claimed_at": now
+    }, synchronize_session=False)
+    db.commit()
+
+    todo = []
+    claimed = db.query(DigestDelivery).filter(DigestDelivery.day == day, DigestDelivery.claim_id == claim_id).all()
+    for row in claimed:
+        tech = by_user[row.user_id]
+        row.chat_id = tech["chat_id"]
+        row.job_count = len(tech["jobs"])
+        todo.append(dict(tech, text=format_digest(tech["full_name"], day, tech["jobs"])))
+    db.commit()
+    return todo
+
+
+def _record(day: date, user_id: int, claim_id: str, status: str, attempts: int, error: Optional[str]):
+    db = SessionLocal()
+    try:
+        db.query(DigestDelivery).filter(
+            DigestDelivery.day == day, DigestDelivery.user_id == user_id, DigestDelivery.claim_id == claim_id
+        ).update({
+            "status": status,
+            "attempts": DigestDelivery.attempts + attempts,
+            "error": error,
+            "sent_at": datetime.now(timezone.utc) if status == DeliveryStatus.SENT else None
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def send_daily_digest(day: Optional[date] = None, bot: Optional[Bot] = None) -> Dict[str, int]:
+    """Send the digest for `day` (default today). Returns counts per delivery status."""
+    day = day or date.today()
+    claim_id = uuid.uuid4().hex
+    db = SessionLocal()
+    try:
+        todo = _prepare_deliveries(db, day, technician_days(db, day), claim_id)
+    finally:
+        db.close()
+
+    counts = {status.value: 0 for status in DeliveryStatus}
+    if not todo:
+        return counts
+
+    own_bot = bot is None
+    if own_bot:
+        bot = Bot(settings.TELEGRAM_BOT_TOKEN)
+        await bot.initialize()
+    limiter = RateLimiter(settings.BOT_BROADCAST_RATE, settings.BOT_CHAT_MIN_INTERVAL)
+
+    async def deliver(tech):
+        status, attempts, error = await send_with_retry(bot, limiter, tech["chat_id"], tech["text"])
+        _record(day, tech["user_id"], claim_id, status, attempts, error)
+        counts[status.value] += 1
+
+    try:
+        await asyncio.gather(*(deliver(tech) for tech in todo))
+    finally:
+        if own_bot:
+            await bot.shutdown()
+    print(f"Daily digest for {day}: {counts}")
+    return counts
+
+
+def digest_status(db: Session, day: date) -> Dict:
+    rows = db.query(DigestDelivery).filter(DigestDelivery.day == day).order_by(DigestDelivery.id).all()
+    counts = {status.value: 0 for status in DeliveryStatus}
+    for row in rows:
+        counts[row.status] = counts.get(row.status, 0) + 1
+    return {
+        "day": day,
+        "counts": counts,
+        "failures": [
+            {"user_id": row.user_id, "status": row.status, "attempts": row.attempts, "error": row.error}
+            for row in rows if row.status in [DeliveryStatus.FAILED, DeliveryStatus.BLOCKED]
+        ],
+    }
+
+
+def seconds_until_digest(now: Optional[datetime] = None) -> float:
+    """Seconds from `now` (local time) to the next BOT_DIGEST_TIME."""
+    now = now or datetime.now()
+    hour, minute = (int(part) for part in settings.BOT_DIGEST_TIME.split(":"))
+    run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return (run_at - now).total_seconds()
+
+
+async def digest_loop():
+    """Send the digest every day at BOT_DIGEST_TIME; runs until cancelled."""
+    while True:
+        await asyncio.sleep(seconds_until_digest())
+        try:
+            await send_daily_digest()
+        except Exception as e:
+            print(f"Daily digest failed: {e}")
@@ -0,0 +1,193 @@
+# Automatic dispatch: propose technician assignments for unassigned jobs.
+# Each job/technician pair gets a cost in "km equivalents":
+#   distance from the technician's jobs that day + a penalty per job already on their day
+#   - a bonus for experience with the job's product type (completed jobs of that product).
+# Jobs are then assigned day by day with a regret heuristic: the jobs that lose the most
+# by not getting their best technician go first, each to its currently cheapest technician
+# with capacity left. That is O(jobs x technicians), fine for thousands of jobs.
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.geo import haversine_km, parse_coords
+from app.core.workload import assignee_join_condition, technician_day_loads
+from app.models.models import Assignment, Job, JobHistory, JobStatus, User, UserRole
+
+DEFAULT_DISTANCE_KM = 20.0 # used when the job or the technician's day has no coordinates
+LOAD_PENALTY_KM = 10.0 # per job already scheduled that day
+SKILL_BONUS_KM = 15.0 # for a technician with plenty of completed jobs on the product
+SKILL_SATURATION = 5 # completed jobs after which experience stops counting
+
+
+def dispatchable_jobs(db: Session, start: date, end: date, job_ids: Optional[List[int]] = None) -> List[Job]:
+    """Pending jobs with no assignment (explicit job_ids ignore the date range)."""
+    assigned = db.query(Assignment.job_id)
+    query = db.query(Job).filter(
+        Job.status == JobStatus.PENDING,
+        ~Job.id.in_(assigned)
+    )
+    if job_ids:
+        query = query.filter(Job.id.in_(job_ids))
+    else:
+        query = query.filter(Job.scheduled_date >= start, Job.scheduled_date <= end)
+    return query.order_by(Job.scheduled_date, Job.id).all()
+
+
+def _day_positions(db: Session, days: List[date], tech_ids: List[int]) -> Dict:
+    """(tech_id, day) -> [lat_sum, long_sum, count] of the jobs already on that day."""
+    rows = db.query(User.id, Job.scheduled_date, Job.location_lat, Job.location_long).select_from(
+        Assignment
+    ).join(Job, Job.id == Assignment.job_id).join(User, assignee_join_condition()).filter(
+        Job.scheduled_date.in_(days),
+        Job.status != JobStatus.CANCELLED,
+        User.id.in_(tech_ids)
+    ).distinct().all()
+    positions = defaultdict(lambda: [0.0, 0.0, 0])
+    for tech_id, day, lat, long in rows:
+        point = parse_coords(lat, long)
+        if point:
+            acc = positions[(tech_id, day)]
+            acc[0] += point[0]
+            acc[1] += point[1]
+            acc[2] += 1
+    return positions
+
+
+def _experience(db: Session, product_types: List[str], tech_ids: List[int]) -> Dict:
+    """(tech_id, product_type) -> completed jobs. Stands in for a skills table."""
+    if not product_types:
+        return {}
+    rows = db.query(User.id, Job.product_type, func.count(func.distinct(Job.id))).select_from(
+        Assignment
+    ).join(Job, Job.id == Assignment.job_id).join(User, assignee_join_condition()).filter(
+        Job.status == JobStatus.COMPLETED,
+        Job.product_type.in_(product_types),
+        User.id.in_(tech_ids)
+    ).group_by(User.id, Job.product_type).all()
+    return {(tech_id, product): count for tech_id, product, count in rows}
+
+
+def propose_dispatch(db: Session, jobs: List[Job], team_id: Optional[int] = None, max_per_day: Optional[int] = None) -> Dict:
+    """Plan assignments for `jobs`. Nothing is written; see apply_dispatch."""
+    max_per_day = max_per_day or settings.DISPATCH_MAX_JOBS_PER_DAY
+    tech_query = db.query(User.id, User.full_name, User.team_id).filter(
+        User.role == UserRole.TECHNICIAN,
+        User.is_active == True
+    )
+    if team_id is not None:
+        tech_query = tech_query.filter(User.team_id == team_id)
+    technicians = {tech_id: {"name": name, "team_id": tid} for tech_id, name, tid in tech_query.all()}
+
+    proposals, unassigned = [], []
+    dated = [job for job in jobs if job.scheduled_date]
+    unassigned.extend({"job_id": job.id, "reason": "No scheduled date"} for job in jobs if not job.scheduled_date)
+    if not technicians:
+        unassigned.extend({"job_id": job.id, "reason": "No active technicians"} for job in dated)
+        return {"proposals": proposals, "unassigned": unassigned}
+    if not dated:
+        return {"proposals": proposals, "unassigned": unassigned}
+
+    tech_ids = list(technicians)
+    days = sorted({job.scheduled_date for job in dated})
+    loads = {
+        key: value["job_count"]
+        for key, value in technician_day_loads(db, days[0], days[-1], user_ids=tech_ids).items()
+    }
+    positions = _day_positions(db, days, tech_ids)
+    experience = _experience(db, list({job.product_type for job in dated if job.product_type}), tech_ids)
+
+    def cost(job, point, tech_id):
+        load = loads.get((tech_id, job.scheduled_date), 0)
+        acc = positions.get((tech_id, job.scheduled_date))
+        distance = None
+        if point and acc and acc[2]:
+            distance = haversine_km(point, (acc[0] / acc[2], acc[1] / acc[2]))
+        skill = min(experience.get((tech_id, job.product_type), 0), SKILL_SATURATION) / SKILL_SATURATION
+        total = (DEFAULT_DISTANCE_KM if distance is None else distance) + LOAD_PENALTY_KM * load - SKILL_BONUS_KM * skill
+        return total, distance
+
+    by_day = defaultdict(list)
+    for job in dated:
+        by_day[job.scheduled_date].append(job)
+
+    for day in days:
+        points = {job.id: parse_coords(job.location_lat, job.location_long) for job in by_day[day]}
+
+        # Regret = how much worse the second-best technician is; big regrets go first
+        def regret(job):
+            costs = sorted(
+                cost(job, points[job.id], tech_id)[0] for tech_id in tech_ids
+                if loads.get((tech_id, day), 0) < max_per_day
+            )
+            if not costs:
+                return 0.0
+            return (costs[1] - costs[0]) if len(costs) > 1 else float("inf")
+
+        for job in sorted(by_day[day], key=regret, reverse=True):
+            best = None
+            for tech_id in tech_ids:
+                if loads.get((tech_id, day), 0) >= max_per_day:
+                    continue
+                total, distance = cost(job, points[job.id], tech_id)
+                if best is None or total < best[0]:
+                    best = (total, distance, tech_id)
+            if best is None:
+                unassigned.append({"job_id": job.id, "reason": f"All technicians full on {day}"})
+                continue
+
+            total, distance, tech_id = best
+            loads[(tech_id, day)] = loads.get((tech_id, day), 0) + 1
+            if points[job.id]:
+                acc = positions[(tech_id, day)]
+                acc[0] += points[job.id][0]
+                acc[1] += points[job.id][1]
+                acc[2] += 1
+            proposals.append({
+                "job_id": job.id,
+                "job_title": job.title,
+                "scheduled_date": day,
+                "technician_id": tech_id,
+                "technician_name": technicians[tech_id]["name"],
+                "team_id": technicians[tech_id]["team_id"],
+                "distance_km": round(distance, 2) if distance is not None else None,
+                "cost": round(total, 2),
+                "day_load": loads[(tech_id, day)],
+            })
+
+    proposals.sort(key=lambda p: (p["scheduled_date"], p["job_id"]))
+    return {"proposals": proposals, "unassigned": unassigned}
+
+
+def apply_dispatch(db: Session, proposals: List[Dict], user_id: Optional[int] = None) -> int:
+    """Write the proposed assignments; jobs assigned meanwhile are skipped. Returns jobs assigned."""
+    job_ids = [p["job_id"] for p in proposals]
+    if not job_ids:
+        return 0
+    still_free = {
+        job.id: job for job in db.query(Job).filter(
+            Job.id.in_(job_ids),
+            Job.status == JobStatus.PENDING,
+            ~Job.id.in_(db.query(Assignment.job_id))
+        ).all()
+    }
+    applied = 0
+    for proposal in proposals:
+        job = still_free.get(proposal["job_id"])
+        if not job:
+            continue
+        db.add(Assignment(job_id=job.id, technician_id=proposal["technician_id"]))
+        job.status = JobStatus.ASSIGNED
+        db.add(JobHistory(
+            job_id=job.id,
+            user_id=user_id,
+            old_status=JobStatus.PENDING,
+            new_status=JobStatus.ASSIGNED,
+            note=f"Auto-dispatched to {proposal['technician_name']}"
+        ))
+        applied += 1
+    db.commit()
+    return applied
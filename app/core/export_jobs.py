@@ -0,0 +1,169 @@
+# Background export jobs.
+# Exports are queued in the `export_jobs` table so any instance can pick them up.
+# A worker claims one job at a time (row lock + SKIP LOCKED on Postgres), writes
+# the file to EXPORT_DIR and reports progress back to the row so the UI can poll.
+import csv
+import json
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.models import ExportJob, ExportStatus
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# kind -> (exporter(db, params, path, progress), file extension) ; registered by the modules that own the queries
+EXPORTERS: Dict[str, Tuple[Callable, str]] = {}
+
+# Local cap on top of the global one, so a single instance never runs more than its share
+_local_slots = threading.BoundedSemaphore(settings.EXPORT_MAX_CONCURRENCY)
+
+
+def exporter(kind: str, extension: str = "csv"):
+    """Decorator registering an export function under `kind`."""
+    def decorator(func):
+        EXPORTERS[kind] = (func, extension)
+        return func
+    return decorator
+
+
+def submit_export(db, kind: str, params: Optional[dict], user_id: Optional[int]) -> ExportJob:
+    if kind not in EXPORTERS:
+        raise ValueError(f"Unknown export kind: {kind}")
+    job = ExportJob(
+        kind=kind,
+        params=json.dumps(params or {}, default=str),
+        status=ExportStatus.QUEUED,
+        progress=0,
+        created_by=user_id
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def _stale_cutoff():
+    return datetime.utcnow() - timedelta(seconds=settings.EXPORT_STALE_SECONDS)
+
+
+def claim_next_export(db) -> Optional[ExportJob]:
+    """Mark the oldest queued (or abandoned) export as running by this worker."""
+    cutoff = _stale_cutoff()
+    running = db.query(ExportJob).filter(
+        ExportJob.status == ExportStatus.RUNNING,
+        ExportJob.heartbeat_at >= cutoff
+    ).count()
+    if running >= settings.EXPORT_MAX_CONCURRENCY:
+        return None
+
+    query = db.query(ExportJob).filter(
+        or_(
+            ExportJob.status == ExportStatus.QUEUED,
+            and_(ExportJob.status == ExportStatus.RUNNING, ExportJob.heartbeat_at < cutoff)
+        )
+    ).order_by(ExportJob.id.asc())
+    if db.bind.dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+
+    job = query.first()
+    if not job:
+        db.rollback()
+        return None
+
+    now = datetime.utcnow()
+    job.status = ExportStatus.RUNNING
+    job.worker_id = WORKER_ID
+    job.started_at = now
+    job.heartbeat_at = now
+    job.progress = 0
+    db.commit()
+    return job
+
+
+def _update_job(job_id: int, **fields):
+    # Separate short session: the exporter's own session may hold an open cursor
+    db = SessionLocal()
+    try:
+        db.query(ExportJob).filter(ExportJob.id == job_id).update(fields)
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_export(job_id: int):
+    db = SessionLocal()
+    try:
+        job = db.query(ExportJob).filter(ExportJob.id == job_id).first()
+        if not job:
+            return
+        func, extension = EXPORTERS.get(job.kind, (None, "csv"))
+        params = json.loads(job.params or "{}")
+        os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+        path = os.path.join(settings.EXPORT_DIR, f"export_{job.id}_{job.kind}.{extension}")
+
+        def progress(done: int, total: Optional[int] = None):
+            fields = {"progress": done, "heartbeat_at": datetime.utcnow()}
+            if total is not None:
+                fields["total"] = total
+            _update_job(job_id, **fields)
+
+        try:
+            if func is None:
+                raise ValueError(f"Unknown export kind: {job.kind}")
+            rows = func(db, params, path, progress)
+            _update_job(
+                job_id,
+                status=ExportStatus.COMPLETED,
+                progress=rows,
+                file_path=path,
+                finished_at=datetime.utcnow()
+            )
+        except Exception as e:
+            print(f"Export {job_id} failed: {e}")
+            _update_job(job_id, status=ExportStatus.FAILED, error=str(e), finished_at=datetime.utcnow())
+    finally:
+        db.close()
+
+
+def run_pending_exports(max_jobs: Optional[int] = None) -> int:
+    """Drain the queue within this instance's concurrency slot. Returns the number of exports run."""
+    if not _local_slots.acquire(blocking=False):
+        return 0
+    processed = 0
+    try:
+        while max_jobs is None or processed < max_jobs:
+            db = SessionLocal()
+            try:
+                job = claim_next_export(db)
+                job_id = job.id if job else None
+            finally:
+                db.close()
+            if job_id is None:
+                break
+            run_export(job_id)
+            processed += 1
+    finally:
+        _local_slots.release()
+    return processed
+
+
+def write_csv(path: str, headers, rows, progress: Callable, total: Optional[int] = None, batch_size: int = 500) -> int:
+    """Stream dict rows into a CSV file, reporting progress every batch."""
+    count = 0
+    progress(0, total)
+    with open(path, "w", newline="", encoding="utf-8-sig") as f: # BOM so Excel reads Thai correctly
+        writer = csv.DictWriter(f, fieldnames=headers, extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+            if count % batch_size == 0:
+                progress(count, total)
+    return count
@@ -0,0 +1,22 @@
+import math
+from typing import Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def parse_coords(lat, long) -> Optional[Tuple[float, float]]:
+    """Job coordinates are stored as strings; None if missing or not a number."""
+    try:
+        point = (float(lat), float(long))
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= point[0] <= 90 and -180 <= point[1] <= 180):
+        return None
+    return point
+
+
+def haversine_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    lat1, lon1 = math.radians(a[0]), math.radians(a[1])
+    lat2, lon2 = math.radians(b[0]), math.radians(b[1])
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
@@ -103,6 +103,7 @@ TRANSLATIONS = {
     "rep_in_progress": {"en": "In Progress", "th": "กำลังทำ"},
     "rep_completion_rate": {"en": "Completion Rate", "th": "อัตราความสำเร็จ"},
     "chart_jobs_by_tech": {"en": "Jobs by Technician", "th": "งานแยกตามช่าง"},
+    "chart_created_completed": {"en": "Created vs Completed (Weekly)", "th": "งานที่สร้างและเสร็จสิ้น (รายสัปดาห์)"},
     
     # --- Teams ---
     "team_header": {"en": "Team Management", "th": "จัดการทีมช่าง"},
@@ -114,6 +115,7 @@ TRANSLATIONS = {
     "modal_edit_team": {"en": "Edit Team", "th": "แก้ไขทีม"},
     "label_team_name": {"en": "Team Name", "th": "ชื่อทีม"},
     "label_team_color": {"en": "Team Color", "th": "สีประจำทีม"},
+    "label_active_jobs": {"en": "Active Jobs", "th": "งานที่ดำเนินอยู่"},
     
     # --- Users ---
     "user_header": {"en": "User Management", "th": "จัดการผู้ใช้งาน"},
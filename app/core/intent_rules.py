@@ -0,0 +1,226 @@
+# Deterministic intent parser for the bot, tried before the Gemini call.
+# Most messages are short and repetitive ("job 123", "งานวันนี้", "done 45"). They are matched
+# here against Thai and English patterns and answered without the LLM. A message counts as
+# understood only when every part of it is accounted for (recognised phrases plus filler and
+# polite words); anything left over, such as a technician or customer name, lowers the
+# confidence and the message goes to the LLM as before.
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+from app.core.cache import ResultCache
+from app.core.database import SessionLocal
+from app.models.models import Project
+
+MIN_CONFIDENCE = 1.0 # only fully understood messages skip the LLM
+PROJECT_INDEX_TTL = 300
+MIN_PARTIAL_PROJECT = 3 # shorter fragments ("9", "a") match too many names by accident
+
+project_index_cache = ResultCache("intents", ttl=PROJECT_INDEX_TTL)
+
+# Trailing politeness and punctuation carry no meaning; "?" and question particles do, so they stay
+_TRAILING = re.compile(r"(?:\s|ครับ|คับ|ค่ะ|คะ|ค่า|นะ|จ้า|จ้ะ|หน่อย|ด้วย|please|pls|[!.,]+)+$")
+# "job 45 done?" asks about the job, "not done 45" says the opposite; neither may update it
+_QUESTION = r"\?|ไหม|มั้ย|หรือยัง|รึยัง|หรือเปล่า|รึเปล่า|เหรอ|^(?:is|was|did|has|have|are|can)\b"
+_NEGATION = r"\b(?:not|isn't|wasn't|didn't|don't|never|no)\b|ไม่"
+
+# (pattern, status) ; Thai words have no spaces around them, so only English uses \b
+_STATUS_VERBS = [
+    (r"\b(?:done|complete[d]?|finish(?:ed)?|close[d]?)\b|เสร็จ(?:แล้ว)?|ปิดงาน|เรียบร้อย(?:แล้ว)?", "completed"),
+    (r"\b(?:start(?:ed)?|begin|working on)\b|เริ่ม(?:งาน|ทำ)?|กำลังทำ", "in_progress"),
+    (r"\b(?:cancel(?:led)?)\b|ยกเลิก", "cancelled"),
+]
+_JOB_REF = r"(?:\b(?:job|task)\b\s*|งาน(?:ที่|เลขที่)?\s*)?#?\s*(\d+)"
+_DETAIL_WORDS = r"\b(?:details?|info|show|view|open)\b|รายละเอียด|ดู"
+
+# (pattern, filters) checked in order; "ยังไม่เสร็จ" must win over "เสร็จ"
+_DATES = [
+    (r"\btoday\b|วันนี้", {"date": "today"}),
+    (r"\btomorrow\b|พรุ่งนี้", {"date": "tomorrow"}),
+    (r"\byesterday\b|เมื่อวาน(?:นี้)?", {"date": "yesterday"}),
+    (r"\bnext week\b|(?:สัปดาห์|อาทิตย์)หน้า", {"period": "next_week"}),
+    (r"\blast week\b|(?:สัปดาห์|อาทิตย์)(?:ที่แล้ว|ก่อน)", {"period": "last_week"}),
+    (r"\bthis week\b|\bweek\b|(?:สัปดาห์|อาทิตย์)นี้", {"period": "week"}),
+]
+_JOB_STATUSES = [
+    (r"\b(?:pending|active|open|remaining|todo)\b|ยังไม่เสร็จ|ค้าง|ที่เหลือ", {"status": "active"}),
+    (r"\b(?:completed|done|finished)\b|เสร็จแล้ว|ที่เสร็จ", {"status": "completed"}),
+]
+_JOB_WORDS = r"\b(?:jobs?|tasks?|works?|schedule|agenda)\b|ตาราง(?:งาน)?|งาน|คิว"
+_PROJECT_WORDS = r"\bprojects?\b|โครงการ|โปรเจ[คก]ต?์?"
+_FILLERS = (
+    r"\b(?:my|me|i|show|list|what|whats|are|is|the|for|any|all|of|do|have|get|see)\b|'s"
+    r"|ดู|ขอ|มี|อะไร|บ้าง|ของ|ฉัน|ผม|หนู|เรา|ทั้งหมด|ที่|ไหม|มั้ย"
+)
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(key: str):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def normalize(text: str) -> str:
+    text = re.sub(r"\s+", " ", (text or "").strip().lower())
+    return _TRAILING.sub("", text).strip()
+
+
+def _leftover(text: str, patterns: List[str]) -> str:
+    """What remains after removing every recognised phrase and filler word."""
+    for pattern in patterns + [_FILLERS]:
+        text = re.sub(pattern, " ", text)
+    return re.sub(r"[\s:,\-#?]+", "", text)
+
+
+def _result(intent: str, params: Dict, confidence: float = 1.0) -> Dict:
+    return {"intent": intent, "params": params, "confidence": confidence, "source": "rules"}
+
+
+def project_names() -> List[str]:
+    """Every project name, cached; the project endpoints invalidate it."""
+    def compute():
+        db = SessionLocal()
+        try:
+            return [name for (name,) in db.query(Project.name).filter(Project.name.isnot(None)).all()]
+        finally:
+            db.close()
+    return project_index_cache.get_or_compute("project_names", compute)
+
+
+def invalidate_project_names():
+    project_index_cache.invalidate("project_names")
+
+
+def _match_project(name: str) -> Optional[str]:
+    """The one project `name` refers to (exact, else a unique match at the start of a word)."""
+    name = name.strip().lower()
+    if not name:
+        return None
+    names = project_names()
+    exact = [n for n in names if n.lower() == name]
+    if exact:
+        return exact[0]
+    if len(name) < MIN_PARTIAL_PROJECT:
+        return None
+    word_start = re.compile(rf"(?<!\w){re.escape(name)}")
+    partial = [n for n in names if word_start.search(n.lower())]
+    return partial[0] if len(partial) == 1 else None
+
+
+def _parse_update(text: str) -> Optional[Dict]:
+    # Only the command itself is checked; a note after ":" may say anything. "-" is not a
+    # separator: "done 45 - done 46" is two commands, which the rules leave to the LLM
+    parts = re.split(r"(\s*:\s*)", text, maxsplit=1)
+    command, rest = parts[0], "".join(parts[1:])
+    if re.search(_NEGATION, command):
+        return None
+    question = re.search(_QUESTION, command)
+    if question:
+        text = re.sub(_QUESTION, " ", command).strip() + rest
+    for verb, status in _STATUS_VERBS:
+        # "done 45", "เสร็จ งาน 45: เปลี่ยนอะไหล่แล้ว" or "job 45 done"
+        for pattern in (
+            rf"^(?:{verb})\s*{_JOB_REF}(?:\s*:\s*(?P<note>.+))?$",
+            rf"^{_JOB_REF}\s*(?:{verb})(?:\s*:\s*(?P<note>.+))?$",
+        ):
+            match = re.match(pattern, text)
+            if not match:
+                continue
+            job_id = int(match.group(1))
+            if question:
+                # "is job 45 done?" is answered with the job's current status
+                return _result("GET_JOB_DETAILS", {"job_id": job_id})
+            params = {"job_id": job_id, "status": status}
+            if match.group("note"):
+                params["note"] = match.group("note").strip()
+            # The bot asks before cancelling; a reason given with it is left to the AI
+            confidence = 0.5 if status == "cancelled" and params.get("note") else 1.0
+            return _result("UPDATE_JOB", params, confidence)
+    return None
+
+
+def _parse_details(text: str) -> Optional[Dict]:
+    match = re.search(_JOB_REF, text)
+    if not match or not re.search(r"\d", text):
+        return None
+    if _leftover(text, [_JOB_REF, _DETAIL_WORDS]):
+        return None
+    return _result("GET_JOB_DETAILS", {"job_id": int(match.group(1))})
+
+
+def _parse_jobs(text: str) -> Optional[Dict]:
+    params = {}
+    used = []
+    for pattern, filters in _DATES:
+        if re.search(pattern, text):
+            params.update(filters)
+            used.append(pattern)
+            break
+    for pattern, filters in _JOB_STATUSES:
+        if re.search(pattern, text):
+            params.update(filters)
+            used.append(pattern)
+            break
+    has_job_word = re.search(_JOB_WORDS, text)
+    if not params and not has_job_word:
+        return None
+    leftover = _leftover(text, used + [_JOB_WORDS])
+    return _result("QUERY_JOBS", params, 1.0 if not leftover else 0.5)
+
+
+def _parse_projects(text: str) -> Optional[Dict]:
+    if not re.search(_PROJECT_WORDS, text):
+        # A bare project name, e.g. "Central Rama 9"; partial matches need the project word
+        project = next((n for n in project_names() if n.lower() == text), None)
+        return _result("QUERY_PROJECTS", {"keyword": project}) if project else None
+    rest = re.sub(_PROJECT_WORDS, " ", text).strip()
+    if not _leftover(rest, []):
+        return _result("QUERY_PROJECTS", {})
+    project = _match_project(rest)
+    if project:
+        return _result("QUERY_PROJECTS", {"keyword": project})
+    return _result("QUERY_PROJECTS", {"keyword": rest}, 0.5)
+
+
+def parse_intent(text: str) -> Optional[Dict]:
+    """Intent in the LLM's format (plus confidence), or None if no rule applies."""
+    text = normalize(text)
+    if not text:
+        return None
+    for parser in (_parse_update, _parse_details, _parse_projects, _parse_jobs):
+        result = parser(text)
+        if result:
+            return result
+    return None
+
+
+def match_intent(text: str) -> Optional[Dict]:
+    """The rule-based intent if it is confident enough, else None (ask the LLM). Counts hits."""
+    result = parse_intent(text)
+    _count("messages")
+    if result and result["confidence"] >= MIN_CONFIDENCE:
+        _count("rule_hits")
+        _count(f"intent:{result['intent']}")
+        return result
+    _count("llm_low_confidence" if result else "llm_no_rule")
+    return None
+
+
+def intent_stats() -> Dict:
+    """Hit-rate counters since this process started."""
+    with _stats_lock:
+        stats = dict(_stats)
+    messages = stats.get("messages", 0)
+    hits = stats.get("rule_hits", 0)
+    return {
+        "messages": messages,
+        "rule_hits": hits,
+        "llm_calls": messages - hits,
+        "llm_low_confidence": stats.get("llm_low_confidence", 0),
+        "llm_no_rule": stats.get("llm_no_rule", 0),
+        "hit_rate": round(hits / messages, 3) if messages else None,
+        "by_intent": {key.split(":", 1)[1]: value for key, value in stats.items() if key.startswith("intent:")},
+    }
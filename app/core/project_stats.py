@@ -0,0 +1,84 @@
+from datetime import date
+from typing import Dict, List
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.models.models import Job, JobHistory, JobStatus, Project
+
+# Project aggregates shared by the API and the bot, so neither has to load project.jobs.
+
+
+def project_stats_query(db: Session):
+    """Projects joined with job_count / completion_percentage from one grouped subquery."""
+    stats = db.query(
+        Job.project_id.label("project_id"),
+        func.count(Job.id).label("job_count"),
+        func.sum(case((Job.status == JobStatus.COMPLETED, 1), else_=0)).label("completed_count")
+    ).filter(Job.project_id.isnot(None)).group_by(Job.project_id).subquery()
+
+    job_count = func.coalesce(stats.c.job_count, 0)
+    completion = case(
+        (job_count > 0, func.coalesce(stats.c.completed_count, 0) * 100 // job_count),
+        else_=0
+    )
+    query = db.query(Project, job_count.label("job_count"), completion.label("completion_percentage")).outerjoin(
+        stats, stats.c.project_id == Project.id
+    )
+    return query, job_count, completion
+
+
+def project_job_counts(db: Session, project_id: int) -> Dict[str, int]:
+    """Jobs per status for one project, plus total and completion percentage."""
+    counts = dict(
+        db.query(Job.status, func.count(Job.id)).filter(
+            Job.project_id == project_id
+        ).group_by(Job.status).all()
+    )
+    total = sum(counts.values())
+    completed = counts.get(JobStatus.COMPLETED.value, 0)
+    return {
+        "total_jobs": total,
+        "completed_jobs": completed,
+        "by_status": counts,
+        "progress": int((completed / total * 100) if total > 0 else 0),
+    }
+
+
+def project_progress_curve(db: Session, project_id: int) -> List[Dict]:
+    """
+    Cumulative completion per day. A job counts as completed from its first transition
+    into 'completed' (JobHistory); jobs created already completed count from created_at.
+    """
+    first_completed = db.query(
+        JobHistory.job_id.label("job_id"),
+        func.min(JobHistory.created_at).label("completed_at")
+    ).filter(
+        JobHistory.new_status == JobStatus.COMPLETED
+    ).group_by(JobHistory.job_id).subquery()
+
+    completed_at = case(
+        (first_completed.c.completed_at.isnot(None), first_completed.c.completed_at),
+        (Job.status == JobStatus.COMPLETED, Job.created_at),
+        else_=None
+    )
+    completed_day = func.date(completed_at)
+    rows = db.query(completed_day, func.count(Job.id)).outerjoin(
+        first_completed, first_completed.c.job_id == Job.id
+    ).filter(
+        Job.project_id == project_id,
+        completed_at.isnot(None)
+    ).group_by(completed_day).order_by(completed_day).all()
+
+    total = db.query(func.count(Job.id)).filter(Job.project_id == project_id).scalar() or 0
+    points = []
+    cumulative = 0
+    for day, count in rows:
+        cumulative += count
+        points.append({
+            "date": day if isinstance(day, date) else date.fromisoformat(str(day)[:10]),
+            "completed": count,
+            "cumulative": cumulative,
+            "percentage": int((cumulative / total * 100) if total > 0 else 0),
+        })
+    return points
@@ -0,0 +1,186 @@
+# Daily route optimization for one technician.
+# Stops are ordered with nearest neighbour and then improved with 2-opt. Time windows from
+# scheduled_time ("14:00", "Morning", ...) are soft constraints: arriving after a window
+# closes costs LATE_PENALTY_KM per minute, which outweighs any detour, so routes keep
+# appointments unless that is impossible. The pairwise distance matrix is a few dozen
+# haversine calls for a day's stops, so it is recomputed on every request rather than cached.
+import re
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.geo import haversine_km, parse_coords
+from app.core.workload import assignee_join_condition
+from app.models.models import Assignment, Job, JobStatus, User
+
+AVERAGE_SPEED_KMH = 30.0 # city driving
+SERVICE_MINUTES = 60 # time spent on site per job
+DAY_START_MINUTES = 8 * 60
+LATE_PENALTY_KM = 5.0 # per minute late
+APPOINTMENT_SLACK_MINUTES = 30 # "14:00" means arrive 13:30-14:30
+
+# Named slots, English and Thai
+NAMED_WINDOWS = {
+    "morning": (8 * 60, 12 * 60),
+    "เช้า": (8 * 60, 12 * 60),
+    "afternoon": (13 * 60, 17 * 60),
+    "บ่าย": (13 * 60, 17 * 60),
+    "evening": (17 * 60, 20 * 60),
+    "เย็น": (17 * 60, 20 * 60),
+}
+ANYTIME = (0, 24 * 60)
+
+def clock_time(scheduled_time: Optional[str]) -> Optional[int]:
+    """Minutes after midnight for an exact appointment ("14:00", "9.30"), else None."""
+    if not scheduled_time:
+        return None
+    match = re.match(r"^(\d{1,2})[:.](\d{2})", scheduled_time.strip())
+    if not match:
+        return None
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if hours > 23 or minutes > 59:
+        return None # "25:99" is a typo, not an appointment
+    return hours * 60 + minutes
+
+
+def time_window(scheduled_time: Optional[str]) -> Tuple[int, int]:
+    """(earliest, latest) arrival in minutes after midnight."""
+    if not scheduled_time:
+        return ANYTIME
+    minutes = clock_time(scheduled_time)
+    if minutes is not None:
+        return (max(minutes - APPOINTMENT_SLACK_MINUTES, 0), minutes + APPOINTMENT_SLACK_MINUTES)
+    text = scheduled_time.strip().lower()
+    for name, window in NAMED_WINDOWS.items():
+        if name in text:
+            return window
+    return ANYTIME
+
+
+def technician_jobs_query(db: Session, user_id: int, day: date):
+    """Non-cancelled jobs on `day` assigned to the technician directly or through their team."""
+    job_ids = db.query(Assignment.job_id).join(User, assignee_join_condition()).filter(User.id == user_id)
+    return db.query(Job).filter(
+        Job.id.in_(job_ids),
+        Job.scheduled_date == day,
+        Job.status != JobStatus.CANCELLED
+    ).order_by(Job.scheduled_time, Job.id)
+
+
+def distance_matrix(points: List[Tuple[int, float, float]]) -> List[List[float]]:
+    """Pairwise km between (id, lat, long) points."""
+    return [
+        [round(haversine_km((a[1], a[2]), (b[1], b[2])), 3) for b in points]
+        for a in points
+    ]
+
+
+def _simulate(order: List[int], matrix, windows) -> Tuple[float, float, List[Dict]]:
+    """Walk the route. Returns (cost, km travelled, per-stop timing). Index 0 is the start."""
+    clock = DAY_START_MINUTES
+    km = 0.0
+    cost = 0.0
+    stops = []
+    previous = 0
+    for node in order:
+        leg = matrix[previous][node]
+        clock += leg / AVERAGE_SPEED_KMH * 60
+        earliest, latest = windows[node]
+        clock = max(clock, earliest) # wait for the window to open
+        late = max(clock - latest, 0)
+        km += leg
+        cost += leg + LATE_PENALTY_KM * late
+        stops.append({"node": node, "leg_km": leg, "arrival": int(clock), "late_minutes": int(late)})
+        clock += SERVICE_MINUTES
+        previous = node
+    return cost, km, stops
+
+
+def _nearest_neighbour(nodes: List[int], matrix, windows) -> List[int]:
+    order = []
+    remaining = set(nodes)
+    current = 0
+    clock = DAY_START_MINUTES
+    while remaining:
+        def step_cost(node):
+            arrival = max(clock + matrix[current][node] / AVERAGE_SPEED_KMH * 60, windows[node][0])
+            late = max(arrival - windows[node][1], 0)
+            # Closing windows first when distances are close
+            return (matrix[current][node] + LATE_PENALTY_KM * late, windows[node][1])
+        node = min(remaining, key=step_cost)
+        clock = max(clock + matrix[current][node] / AVERAGE_SPEED_KMH * 60, windows[node][0]) + SERVICE_MINUTES
+        order.append(node)
+        remaining.remove(node)
+        current = node
+    return order
+
+
+def _two_opt(order: List[int], matrix, windows) -> List[int]:
+    best_cost = _simulate(order, matrix, windows)[0]
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order) - 1):
+            for j in range(i + 1, len(order)):
+                candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                cost = _simulate(candidate, matrix, windows)[0]
+                if cost < best_cost - 1e-9:
+                    order, best_cost = candidate, cost
+                    improved = True
+    return order
+
+
+def plan_route(jobs: List, day: date, start: Optional[Tuple[float, float]] = None) -> Dict:
+    """
+    Order one technician's jobs for `day`. `start` is where the day begins (e.g. home);
+    without it the route starts at the first stop. Jobs without coordinates keep their
+    scheduled order after the routed ones.
+    """
+    located = []
+    unrouted = []
+    for job in jobs:
+        point = parse_coords(job.location_lat, job.location_long)
+        (located if point else unrouted).append((job, point))
+
+    scheduled_order = sorted(located, key=lambda jp: (time_window(jp[0].scheduled_time), jp[0].id))
+    if not located:
+        return {
+            "ordered": [j for j, _ in unrouted],
+            "stops": [],
+            "unrouted": [j.id for j, _ in unrouted],
+            "distance_km": 0.0,
+            "naive_distance_km": 0.0,
+        }
+
+    # Node 0 is the start; with no start point it sits on the first scheduled stop
+    origin = start or scheduled_order[0][1]
+    points = [(0, origin[0], origin[1])] + [(job.id, p[0], p[1]) for job, p in scheduled_order]
+    matrix = distance_matrix(points)
+    windows = [ANYTIME] + [time_window(job.scheduled_time) for job, _ in scheduled_order]
+    nodes = list(range(1, len(points)))
+
+    order = _two_opt(_nearest_neighbour(nodes, matrix, windows), matrix, windows)
+    _, km, timings = _simulate(order, matrix, windows)
+    naive_km = _simulate(nodes, matrix, windows)[1]
+
+    stops = []
+    for timing in timings:
+        job = scheduled_order[timing["node"] - 1][0]
+        stops.append({
+            "job_id": job.id,
+            "title": job.title,
+            "scheduled_time": job.scheduled_time,
+            "location_lat": job.location_lat,
+            "location_long": job.location_long,
+            "leg_km": round(timing["leg_km"], 2),
+            "arrival": f"{timing['arrival'] // 60:02d}:{timing['arrival'] % 60:02d}",
+            "late_minutes": timing["late_minutes"],
+        })
+    return {
+        "ordered": [scheduled_order[node - 1][0] for node in order] + [j for j, _ in unrouted],
+        "stops": stops,
+        "unrouted": [j.id for j, _ in unrouted],
+        "distance_km": round(km, 2),
+        "naive_distance_km": round(naive_km, 2),
+    }
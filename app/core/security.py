@@ -1,3 +1,6 @@
+import base64
+import hashlib
+import hmac
 from datetime import datetime, timedelta
 from typing import Any, Union
 from jose import jwt
@@ -24,3 +27,11 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+def sign_value(value: str, length: int = 10) -> str:
+    """Short HMAC of `value`, for places with little room such as Telegram callback data (64 bytes)."""
+    digest = hmac.new(settings.SECRET_KEY.encode(), value.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode()[:length]
+
+def verify_signed_value(value: str, signature: str, length: int = 10) -> bool:
+    return hmac.compare_digest(sign_value(value, length), signature or "")
@@ -0,0 +1,233 @@
+# Time-in-status analytics.
+# Status segments are derived from JobHistory transitions with LEAD() over created_at
+# and stored in job_status_durations. refresh_status_durations() only rebuilds the jobs
+# that received new transitions since the last refresh, so it is cheap to call on read.
+# Refreshes are serialized (a lock per process plus a Postgres advisory lock across
+# instances) so concurrent reads cannot insert the same segments twice.
+# The watermark is the highest history id with a segment. A transaction can take a lower id
+# and commit after a higher one was processed, so the last WATERMARK_OVERLAP ids below it
+# are re-checked for transitions that still have no segment.
+import statistics
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import exists, func, or_, text
+from sqlalchemy.orm import Session
+
+from app.models.models import Assignment, Job, JobHistory, JobStatusDuration, Team, User
+
+REFRESH_BATCH = 500 # jobs rebuilt per statement
+REFRESH_LOCK_KEY = 730301 # pg_advisory_xact_lock key, any app-wide constant
+WATERMARK_OVERLAP = 1000 # history ids below the watermark re-checked on each refresh
+
+_refresh_lock = threading.Lock()
+
+
+def _is_transition():
+    # Note-only log entries keep the same status and must not split a segment
+    return or_(JobHistory.old_status.is_(None), JobHistory.old_status != JobHistory.new_status)
+
+
+def _seconds_between(start: datetime, end: datetime) -> Optional[int]:
+    if not start or not end:
+        return None
+    # SQLite returns naive datetimes, Postgres aware ones; compare like with like
+    if (start.tzinfo is None) != (end.tzinfo is None):
+        start = start.replace(tzinfo=None)
+        end = end.replace(tzinfo=None)
+    return max(int((end - start).total_seconds()), 0)
+
+
+def _rebuild_jobs(db: Session, job_ids: List[int]):
+    lead_created_at = func.lead(JobHistory.created_at, type_=JobHistory.created_at.type).over(
+        partition_by=JobHistory.job_id,
+        order_by=(JobHistory.created_at, JobHistory.id)
+    )
+    row_number = func.row_number().over(
+        partition_by=JobHistory.job_id,
+        order_by=(JobHistory.created_at, JobHistory.id)
+    )
+    rows = db.query(
+        JobHistory.id,
+        JobHistory.job_id,
+        JobHistory.old_status,
+        JobHistory.new_status,
+        JobHistory.created_at,
+        lead_created_at.label("left_at"),
+        row_number.label("seq"),
+        Job.created_at.label("job_created_at")
+    ).join(Job, Job.id == JobHistory.job_id).filter(
+        JobHistory.job_id.in_(job_ids),
+        JobHistory.new_status.isnot(None),
+        _is_transition()
+    ).all()
+
+    db.query(JobStatusDuration).filter(
+        JobStatusDuration.job_id.in_(job_ids)
+    ).delete(synchronize_session=False)
+
+    segments = []
+    for row in rows:
+        if row.seq == 1 and row.old_status:
+            # Status the job was created with, up to its first transition
+            segments.append(dict(
+                job_id=row.job_id,
+                history_id=None,
+                status=row.old_status,
+                entered_at=row.job_created_at,
+                left_at=row.created_at,
+                duration_seconds=_seconds_between(row.job_created_at, row.created_at)
+            ))
+        segments.append(dict(
+            job_id=row.job_id,
+            history_id=row.id,
+            status=row.new_status,
+            entered_at=row.created_at,
+            left_at=row.left_at,
+            duration_seconds=_seconds_between(row.created_at, row.left_at)
+        ))
+    if segments:
+        db.bulk_insert_mappings(JobStatusDuration, segments)
+
+
+def refresh_status_durations(db: Session, rebuild: bool = False) -> int:
+    """Bring job_status_durations up to date. Returns the number of jobs rebuilt."""
+    with _refresh_lock:
+        if db.bind.dialect.name == "postgresql":
+            # Held until the commit below; the watermark is read after it, so a refresh
+            # that waited sees the rows the previous one committed and skips those jobs
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": REFRESH_LOCK_KEY})
+        try:
+            if rebuild:
+                db.query(JobStatusDuration).delete(synchronize_session=False)
+                last_history_id = 0
+            else:
+                last_history_id = db.query(func.max(JobStatusDuration.history_id)).scalar() or 0
+
+            has_segment = exists().where(JobStatusDuration.history_id == JobHistory.id)
+            job_ids = [
+                job_id for (job_id,) in db.query(JobHistory.job_id).filter(
+                    JobHistory.id > max(last_history_id - WATERMARK_OVERLAP, 0),
+                    JobHistory.new_status.isnot(None),
+                    _is_transition(),
+                    ~has_segment
+                ).distinct().all()
+            ]
+            for i in range(0, len(job_ids), REFRESH_BATCH):
+                _rebuild_jobs(db, job_ids[i:i + REFRESH_BATCH])
+            db.commit()
+        except Exception:
+            db.rollback() # also releases the advisory lock
+            raise
+    return len(job_ids)
+
+
+def get_job_status_durations(db: Session, job_id: int) -> List[Dict]:
+    now = datetime.now(timezone.utc)
+    segments = db.query(JobStatusDuration).filter(
+        JobStatusDuration.job_id == job_id
+    ).order_by(JobStatusDuration.entered_at, JobStatusDuration.id).all()
+
+    result = []
+    for s in segments:
+        duration = s.duration_seconds
+        if s.left_at is None:
+            duration = _seconds_between(s.entered_at, now) # Still in this status
+        result.append({
+            "status": s.status,
+            "entered_at": s.entered_at,
+            "left_at": s.left_at,
+            "duration_seconds": duration,
+            "current": s.left_at is None
+        })
+    return result
+
+
+def _summarize(values: List[int]) -> Dict:
+    values = sorted(values)
+    n = len(values)
+    return {
+        "count": n,
+        "avg_hours": round(sum(values) / n / 3600, 2),
+        "p50_hours": round(statistics.median(values) / 3600, 2),
+        "p90_hours": round(values[min(int(n * 0.9), n - 1)] / 3600, 2),
+        "max_hours": round(values[-1] / 3600, 2),
+    }
+
+
+def get_status_distribution(db: Session, group_by: str = "job_type", start: Optional[datetime] = None, end: Optional[datetime] = None, job_id_filter=None) -> List[Dict]:
+    """
+    Duration stats of closed status segments per (group, status).
+    group_by: job_type, team, technician or status (no extra grouping).
+    """
+    columns = lambda group_col: (
+        group_col.label("grp"),
+        JobStatusDuration.status,
+        JobStatusDuration.duration_seconds,
+        JobStatusDuration.id
+    )
+    if group_by == "job_type":
+        query = db.query(*columns(Job.job_type)).join(Job, Job.id == JobStatusDuration.job_id)
+    elif group_by == "technician":
+        query = db.query(*columns(User.full_name)).join(
+            Assignment, Assignment.job_id == JobStatusDuration.job_id
+        ).join(User, User.id == Assignment.technician_id)
+    elif group_by == "team":
+        # Team assignment, or the team of the assigned technician
+        query = db.query(*columns(Team.name)).join(
+            Assignment, Assignment.job_id == JobStatusDuration.job_id
+        ).outerjoin(User, User.id == Assignment.technician_id).join(
+            Team, Team.id == func.coalesce(Assignment.team_id, User.team_id)
+        )
+    elif group_by == "status":
+        query = db.query(*columns(JobStatusDuration.status))
+    else:
+        raise ValueError(f"Unknown group_by: {group_by}")
+
+    # A job with several assignees in one group counts once per segment
+    query = query.distinct()
+    query = query.filter(JobStatusDuration.duration_seconds.isnot(None))
+    if start:
+        query = query.filter(JobStatusDuration.entered_at >= start)
+    if end:
+        query = query.filter(JobStatusDuration.entered_at < end)
+    if job_id_filter is not None:
+        query = query.filter(JobStatusDuration.job_id.in_(job_id_filter))
+
+    if db.bind.dialect.name == "postgresql":
+        return _distribution_sql(query)
+
+    groups: Dict = {}
+    for group, status, seconds, _ in query.all():
+        groups.setdefault((group, status), []).append(seconds)
+    return [
+        {"group": group, "status": status, **_summarize(values)}
+        for (group, status), values in sorted(groups.items(), key=lambda kv: (str(kv[0][0]), kv[0][1]))
+    ]
+
+
+def _distribution_sql(query) -> List[Dict]:
+    # Postgres: let the database aggregate instead of shipping every segment
+    sub = query.subquery()
+    group, status, seconds = sub.c.grp, sub.c.status, sub.c.duration_seconds
+    rows = query.session.query(
+        group, status,
+        func.count(seconds),
+        func.avg(seconds),
+        func.percentile_cont(0.5).within_group(seconds),
+        func.percentile_cont(0.9).within_group(seconds),
+        func.max(seconds)
+    ).group_by(group, status).order_by(group, status).all()
+    return [
+        {
+            "group": r[0],
+            "status": r[1],
+            "count": r[2],
+            "avg_hours": round(float(r[3]) / 3600, 2),
+            "p50_hours": round(float(r[4]) / 3600, 2),
+            "p90_hours": round(float(r[5]) / 3600, 2),
+            "max_hours": round(float(r[6]) / 3600, 2),
+        }
+        for r in rows
+    ]
@@ -1,13 +1,31 @@
-from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
-from telegram.ext import Application, CommandHandler, ContextTypes, ConversationHandler, MessageHandler, filters
+import uuid
+from html import escape
+from telegram import Update, ForceReply, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, ContextTypes, ConversationHandler, MessageHandler, filters
 from app.core.config import settings
 from app.core.bot_services import BotService
 from app.core.ai_agent import ai_agent
+from app.core.bot_persistence import CachedBot, DBPersistence
+from app.core.intent_rules import match_intent
+from app.core.security import sign_value, verify_signed_value
+from app.models.models import JobStatus, UserRole
 
 # Stages
 LOGIN_USER, LOGIN_PASS, CONFIRM_LOGOUT = range(3)
 CHANGE_PWD_OLD, CHANGE_PWD_NEW = range(3, 5)
 
+JOBS_PAGE_SIZE = 8
+POLLING_PERSISTENCE_INTERVAL = 10 # seconds between state saves when polling
+MAX_SAVED_LISTS = 20 # job listings per chat whose filters are kept for paging
+
+# Status buttons: action -> status it sets ("cancel" only asks for confirmation)
+ACTION_STATUS = {
+    "start": JobStatus.IN_PROGRESS.value,
+    "complete": JobStatus.COMPLETED.value,
+    "cancel!": JobStatus.CANCELLED.value,
+}
+ACTION_DONE = {"start": "Job started ▶️", "complete": "Job completed ✅", "cancel!": "Job cancelled ❌"}
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message when the command /start is issued."""
     user = update.effective_user
@@ -41,6 +59,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     /logout - Disconnect account
     
     You can also chat normally (e.g. "my jobs today").
+    Open a job to update it with its Start / Complete / Cancel buttons.
     """
     await update.message.reply_text(help_text)
 
@@ -86,6 +105,159 @@ def _format_jobs(jobs):
         
     return msg
 
+# --- Paged job listings ---
+def _status_icon(status):
+    return {"completed": "✅", "in_progress": "🔧", "cancelled": "❌"}.get(status, "⏳")
+
+def _job_line(job):
+    """One compact line per job; full details are behind the job's button."""
+    when = job.scheduled_date.strftime("%d/%m") if job.scheduled_date else "-"
+    if job.scheduled_time:
+        when += f" {job.scheduled_time}"
+    return f"{_status_icon(job.status)} <b>#{job.id}</b> {escape(job.title or '')} · {when} · {escape(job.customer_name or '-')}"
+
+def _render_job_page(user_id, filters, token, page):
+    result = BotService.get_jobs_page(user_id, filters, page=page, page_size=JOBS_PAGE_SIZE)
+    jobs = result["jobs"]
+    if not jobs:
+        text = "No jobs found matching your criteria." if page == 0 else "No more jobs."
+    else:
+        first = page * JOBS_PAGE_SIZE + 1
+        text = f"<b>Jobs {first}-{first + len(jobs) - 1}</b> (page {page + 1})\n\n"
+        text += "\n".join(_job_line(job) for job in jobs)
+
+    buttons = [
+        [InlineKeyboardButton(f"#{job.id} {job.title}"[:40], callback_data=f"job:{job.id}")]
+        for job in jobs
+    ]
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("◀ Prev", callback_data=f"jobs:{token}:{page - 1}"))
+    if result["has_more"]:
+        nav.append(InlineKeyboardButton("Next ▶", callback_data=f"jobs:{token}:{page + 1}"))
+    if nav:
+        buttons.append(nav)
+    return text, InlineKeyboardMarkup(buttons) if buttons else None
+
+async def _reply_job_list(update, context, user, job_filters):
+    """Send page 1 of a listing and remember its filters so the buttons can page it."""
+    token = uuid.uuid4().hex[:8]
+    saved = context.chat_data.setdefault("job_lists", {})
+    saved[token] = job_filters
+    while len(saved) > MAX_SAVED_LISTS:
+        saved.pop(next(iter(saved)))
+
+    text, markup = _render_job_page(user.id, job_filters, token, 0)
+    await update.message.reply_html(text, reply_markup=markup, disable_web_page_preview=True)
+
+async def on_jobs_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    user = BotService.get_user_by_telegram_id(update.effective_chat.id)
+    if not user:
+        await query.answer("Please /link your account first.", show_alert=True)
+        return
+    _, token, page = query.data.split(":")
+    job_filters = context.chat_data.get("job_lists", {}).get(token)
+    if job_filters is None:
+        await query.answer("This list has expired, please ask again.", show_alert=True)
+        return
+    await query.answer()
+    text, markup = _render_job_page(user.id, job_filters, token, int(page))
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=markup, disable_web_page_preview=True)
+
+async def on_job_detail(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    user = BotService.get_user_by_telegram_id(update.effective_chat.id)
+    if not user:
+        await query.answer("Please /link your account first.", show_alert=True)
+        return
+    job = BotService.get_job_details(int(query.data.split(":")[1]), user.id)
+    if not job:
+        await query.answer("Job not found or access denied.", show_alert=True)
+        return
+    await query.answer()
+    await query.message.reply_html(_format_jobs([job]), reply_markup=_job_actions(job, update.effective_chat.id))
+
+# --- Status buttons ---
+# callback_data is "act:<job>:<action>:<status shown>:<signature>". The signature binds it
+# to the chat, so data cannot be forged or replayed elsewhere; the shown status makes a
+# stale button (job changed since) fail instead of overwriting the newer status.
+def _action_button(label, chat_id, job_id, action, status):
+    payload = f"act:{job_id}:{action}:{status}"
+    return InlineKeyboardButton(label, callback_data=f"{payload}:{sign_value(f'{chat_id}:{payload}')}")
+
+def _job_actions(job, chat_id):
+    status = str(getattr(job.status, 'value', job.status))
+    row = []
+    if status in [JobStatus.PENDING.value, JobStatus.ASSIGNED.value]:
+        row.append(_action_button("▶️ Start", chat_id, job.id, "start", status))
+    elif status == JobStatus.IN_PROGRESS.value:
+        row.append(_action_button("✅ Complete", chat_id, job.id, "complete", status))
+    if status not in [JobStatus.COMPLETED.value, JobStatus.CANCELLED.value]:
+        row.append(_action_button("❌ Cancel", chat_id, job.id, "cancel", status))
+    note = [_action_button("📝 Add note", chat_id, job.id, "note", status)]
+    return InlineKeyboardMarkup([row, note] if row else [note])
+
+def _parse_action(data, chat_id):
+    """(job_id, action, status) from signed callback data, or None if invalid."""
+    parts = data.split(":")
+    if len(parts) != 5:
+        return None
+    payload = ":".join(parts[:4])
+    if not verify_signed_value(f"{chat_id}:{payload}", parts[4]):
+        return None
+    try:
+        return int(parts[1]), parts[2], parts[3]
+    except ValueError:
+        return None
+
+async def on_job_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Status buttons write directly through BotService; no AI round trip."""
+    query = update.callback_query
+    chat_id = update.effective_chat.id
+    user = BotService.get_user_by_telegram_id(chat_id)
+    if not user:
+        await query.answer("Please /link your account first.", show_alert=True)
+        return
+    parsed = _parse_action(query.data, chat_id)
+    if not parsed:
+        await query.answer("This button is no longer valid.", show_alert=True)
+        return
+    job_id, action, status = parsed
+
+    if action == "cancel":
+        await query.answer()
+        await query.edit_message_reply_markup(InlineKeyboardMarkup([[
+            _action_button("Yes, cancel job", chat_id, job_id, "cancel!", status),
+            _action_button("Back", chat_id, job_id, "back", status),
+        ]]))
+        return
+    if action == "note":
+        context.chat_data["note_job_id"] = job_id
+        await query.answer()
+        await query.message.reply_text(f"Send your note for job #{job_id}, or /cancel.", reply_markup=ForceReply(selective=True))
+        return
+
+    if action in ACTION_STATUS:
+        success, msg = BotService.update_job_status(job_id, user.id, ACTION_STATUS[action], expected_status=status)
+        await query.answer(ACTION_DONE[action] if success else msg, show_alert=not success)
+    else: # back
+        await query.answer()
+
+    # Refresh the message with the current status and the buttons that go with it
+    job = BotService.get_job_details(job_id, user.id)
+    if job:
+        await query.edit_message_text(
+            _format_jobs([job]), parse_mode="HTML",
+            reply_markup=_job_actions(job, chat_id), disable_web_page_preview=True
+        )
+
+async def cmd_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if context.chat_data.pop("note_job_id", None):
+        await update.message.reply_text("Note cancelled.")
+    else:
+        await update.message.reply_text("Nothing to cancel.")
+
 async def _get_auth_user(update):
     chat_id = update.effective_chat.id
     user = BotService.get_user_by_telegram_id(chat_id)
@@ -97,32 +269,43 @@ async def _get_auth_user(update):
 async def cmd_today(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = await _get_auth_user(update)
     if not user: return
-    jobs = BotService.get_jobs(user.id, {'date': 'today'})
-    await update.message.reply_html(_format_jobs(jobs))
+    if user.role == UserRole.TECHNICIAN:
+        # Technicians get their day in driving order
+        route = BotService.get_route(user.id)
+        header = ""
+        if route["stops"]:
+            header = f"🛣️ <b>Route:</b> {route['distance_km']} km (scheduled order: {route['naive_distance_km']} km)\n\n"
+        # One button per job opens it with its status buttons
+        buttons = [
+            [InlineKeyboardButton(f"#{job.id} {job.title}"[:40], callback_data=f"job:{job.id}")]
+            for job in route["ordered"]
+        ]
+        await update.message.reply_html(
+            header + _format_jobs(route["ordered"]),
+            reply_markup=InlineKeyboardMarkup(buttons) if buttons else None
+        )
+        return
+    await _reply_job_list(update, context, user, {'date': 'today'})
 
 async def cmd_tomorrow(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = await _get_auth_user(update)
     if not user: return
-    jobs = BotService.get_jobs(user.id, {'date': 'tomorrow'})
-    await update.message.reply_html(_format_jobs(jobs))
+    await _reply_job_list(update, context, user, {'date': 'tomorrow'})
 
 async def cmd_week(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = await _get_auth_user(update)
     if not user: return
-    jobs = BotService.get_jobs(user.id, {'period': 'week'})
-    await update.message.reply_html(_format_jobs(jobs))
+    await _reply_job_list(update, context, user, {'period': 'week'})
 
 async def cmd_nextweek(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = await _get_auth_user(update)
     if not user: return
-    jobs = BotService.get_jobs(user.id, {'period': 'next_week'})
-    await update.message.reply_html(_format_jobs(jobs))
+    await _reply_job_list(update, context, user, {'period': 'next_week'})
 
 async def cmd_lastweek(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = await _get_auth_user(update)
     if not user: return
-    jobs = BotService.get_jobs(user.id, {'period': 'last_week'})
-    await update.message.reply_html(_format_jobs(jobs))
+    await _reply_job_list(update, context, user, {'period': 'last_week'})
 
 async def cmd_projects(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = await _get_auth_user(update) # Auth check
@@ -173,6 +356,12 @@ async def login_pass(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await update.message.reply_text("Invalid Credentials. /link to try again.")
         return ConversationHandler.END
 
+async def cmd_logout(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if BotService.unlink_telegram_id(update.effective_chat.id):
+        await update.message.reply_text("Your account has been disconnected. Use /link to connect again.")
+    else:
+        await update.message.reply_text("This chat is not linked to any account.")
+
 async def cancel_login(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     await update.message.reply_text("Login cancelled.")
     return ConversationHandler.END
@@ -188,11 +377,20 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text("Please /link your account first.")
         return
 
-    # 2. Analyze Intent
-    await context.bot.send_chat_action(chat_id=chat_id, action="typing")
-    result = ai_agent.analyze_intent(text)
+    # A reply to "Add note" is logged as is, without the AI
+    note_job_id = context.chat_data.pop("note_job_id", None)
+    if note_job_id:
+        success, msg = BotService.add_job_note(note_job_id, user.id, text)
+        await update.message.reply_text(f"{'Success:' if success else 'Failed:'} {msg}")
+        return
+
+    # 2. Analyze Intent (common phrasings are parsed without the AI)
+    result = match_intent(text)
+    if not result:
+        await context.bot.send_chat_action(chat_id=chat_id, action="typing")
+        result = await ai_agent.analyze_intent(text)
     print(f"DEBUG: User Text = '{text}'")
-    print(f"DEBUG: AI Result = {result}")
+    print(f"DEBUG: Intent Result = {result}")
     
     intent = result.get('intent')
     # AI might return 'params' or 'parameters'
@@ -200,12 +398,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     # 3. Execute
     if intent == "QUERY_JOBS":
-        jobs = BotService.get_jobs(user.id, params)
-        if not jobs:
-             await update.message.reply_text("No jobs found matching your criteria.")
-        else:
-            msg = _format_jobs(jobs)
-            await update.message.reply_html(msg)
+        await _reply_job_list(update, context, user, params)
 
     elif intent == "QUERY_PROJECTS":
         # Check if looking for specific project details
@@ -227,13 +420,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                  bar = "█" * filled + "░" * (bar_length - filled)
                  
                  msg += f"Progress: {progress}% [{bar}]\n"
-                 msg += f"Jobs: {details['total_jobs']} tasks\n"
+                 msg += f"Jobs: {details['completed_jobs']}/{details['total_jobs']} completed\n"
                  msg += f"Start: {details['start_date']}  End: {details['end_date']}\n\n"
                  
                  if details['job_list']:
                      msg += "<b>Job List:</b>\n"
                      for job_title in details['job_list']:
                          msg += f"- {job_title}\n"
+                     if details['more_jobs']:
+                         msg += f"... and {details['more_jobs']} more\n"
                  
                  await update.message.reply_html(msg)
                  return
@@ -256,7 +451,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         if job:
             # Re-use the rich format for consistency, just for one job
             msg = _format_jobs([job])
-            await update.message.reply_html(msg)
+            await update.message.reply_html(msg, reply_markup=_job_actions(job, chat_id))
         else:
             await update.message.reply_text("Job not found or access denied.")
 
@@ -264,7 +459,23 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         job_id = params.get('job_id')
         status = params.get('status')
         note = params.get('note')
-        
+
+        # A cancellation read by the rules is confirmed with the signed buttons first
+        if status == JobStatus.CANCELLED.value and result.get("source") == "rules":
+            job = BotService.get_job_details(job_id, user.id)
+            if not job:
+                await update.message.reply_text("Job not found or access denied.")
+                return
+            shown = str(getattr(job.status, 'value', job.status))
+            await update.message.reply_html(
+                f"{_format_jobs([job])}\nCancel this job?",
+                reply_markup=InlineKeyboardMarkup([[
+                    _action_button("Yes, cancel job", chat_id, job.id, "cancel!", shown),
+                    _action_button("Back", chat_id, job.id, "back", shown),
+                ]]),
+            )
+            return
+
         success, msg = BotService.update_job_status(job_id, user.id, status, note)
         status_label = "Success:" if success else "Failed:"
         await update.message.reply_text(f"{status_label} {msg}")
@@ -277,13 +488,27 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         reply = params.get('reply', "I didn't quite catch that.")
         await update.message.reply_text(reply)
 
-def create_app():
-    """Create and configure the bot application."""
+def create_app(webhook: bool = False):
+    """
+    Create and configure the bot application.
+    Webhook instances share their state through the database (see bot_persistence).
+    """
     if not settings.TELEGRAM_BOT_TOKEN or settings.TELEGRAM_BOT_TOKEN == "YOUR_BOT_TOKEN_HERE":
         print("Telegram Token not set, skipping bot setup.")
         return None
     
-    application = Application.builder().token(settings.TELEGRAM_BOT_TOKEN).build()
+    builder = Application.builder()
+    if webhook:
+        builder = builder.bot(CachedBot(token=settings.TELEGRAM_BOT_TOKEN))
+    else:
+        builder = builder.token(settings.TELEGRAM_BOT_TOKEN)
+    persistence = DBPersistence(shared=webhook, update_interval=POLLING_PERSISTENCE_INTERVAL)
+    application = builder.persistence(persistence).build()
+
+    try:
+        print(f"Bot user cache warmed with {BotService.warm_user_cache()} linked accounts")
+    except Exception as e:
+        print(f"Bot user cache warm-up failed: {e}")
 
     # Conversation Handler for Login
     login_conv = ConversationHandler(
@@ -293,11 +518,14 @@ def create_app():
             LOGIN_PASS: [MessageHandler(filters.TEXT & ~filters.COMMAND, login_pass)],
         },
         fallbacks=[CommandHandler("cancel", cancel_login)],
+        name="login",
+        persistent=True,
     )
 
     application.add_handler(login_conv)
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("logout", cmd_logout))
     
     # New Fallback Commands
     application.add_handler(CommandHandler("today", cmd_today))
@@ -308,6 +536,12 @@ def create_app():
     application.add_handler(CommandHandler("lastweek", cmd_lastweek))
     application.add_handler(CommandHandler("projects", cmd_projects))
     
+    # Inline keyboard buttons of paged job listings
+    application.add_handler(CallbackQueryHandler(on_jobs_page, pattern=r"^jobs:"))
+    application.add_handler(CallbackQueryHandler(on_job_detail, pattern=r"^job:\d+$"))
+    application.add_handler(CallbackQueryHandler(on_job_action, pattern=r"^act:"))
+    application.add_handler(CommandHandler("cancel", cmd_cancel))
+    
     # Generic Message Handler for AI
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
@@ -316,4 +550,8 @@ def create_app():
 async def process_webhook_update(application: Application, data: dict):
     """Process a single update from a webhook."""
     update = Update.de_json(data, application.bot)
+    if isinstance(application.persistence, DBPersistence):
+        await application.persistence.load_for_update(application, update)
     await application.process_update(update)
+    # The instance may be frozen or recycled after this, so save state now rather than on a timer
+    await application.update_persistence()
@@ -0,0 +1,211 @@
+# Bulk user import (CSV / JSON).
+# Rows are validated up front, passwords are hashed in a process pool (PBKDF2 is
+# CPU-bound and would otherwise pin the request worker), then users are inserted
+# in batches. Every rejected row is reported with its row number (1 = first user;
+# the CSV header is not counted) instead of aborting the whole import.
+import csv
+import io
+import json
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.security import get_password_hash
+from app.models.models import Team, User, UserRole
+
+INSERT_BATCH_SIZE = 200
+POOL_THRESHOLD = 8 # below this, starting worker processes costs more than it saves
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+class ImportRow(BaseModel):
+    username: str
+    password: str
+    full_name: str
+    role: UserRole = UserRole.TECHNICIAN
+    phone_number: Optional[str] = None
+    email: Optional[str] = None
+    telegram_id: Optional[str] = None
+    team_id: Optional[int] = None
+    team: Optional[str] = None # team name, alternative to team_id
+    is_active: bool = True
+
+
+def parse_rows(content: bytes, fmt: str) -> List[Dict]:
+    """Decode an uploaded file into a list of dict rows. fmt: csv or json."""
+    text = content.decode("utf-8-sig") # tolerate the BOM Excel writes
+    if fmt == "json":
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get("users", [])
+        if not isinstance(data, list):
+            raise ValueError("JSON import must be a list of users (or {\"users\": [...]})")
+        return data
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        # Empty cells mean "not given", not empty strings
+        return [
+            {k.strip(): v.strip() for k, v in row.items() if k and v is not None and v.strip() != ""}
+            for row in reader
+        ]
+    raise ValueError(f"Unknown import format: {fmt}")
+
+
+def _error(line: int, row: Dict, message: str) -> Dict:
+    # "row" counts data rows from 1, not file lines (no header, no multi-line cells)
+    return {"row": line, "username": row.get("username") if isinstance(row, dict) else None, "error": message}
+
+
+def validate_rows(db: Session, rows: List[Dict]) -> Tuple[List[Tuple[int, ImportRow]], List[Dict]]:
+    """Split rows into (line, ImportRow) pairs ready to insert and per-row errors."""
+    errors = []
+    parsed = []
+    for line, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append(_error(line, {}, "Row is not an object"))
+            continue
+        try:
+            parsed.append((line, ImportRow(**row)))
+        except ValidationError as e:
+            message = "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+            errors.append(_error(line, row, message))
+
+    # One query each for existing usernames, telegram ids and teams instead of one per row
+    usernames = {item.username for _, item in parsed}
+    existing = set()
+    for i in range(0, len(usernames), 1000):
+        chunk = list(usernames)[i:i + 1000]
+        existing.update(u for (u,) in db.query(User.username).filter(User.username.in_(chunk)).all())
+    telegram_ids = {item.telegram_id for _, item in parsed if item.telegram_id}
+    taken_telegram = set()
+    if telegram_ids:
+        taken_telegram = {t for (t,) in db.query(User.telegram_id).filter(User.telegram_id.in_(list(telegram_ids))).all()}
+    teams = {name: team_id for team_id, name in db.query(Team.id, Team.name).all()}
+    team_ids = set(teams.values())
+
+    valid = []
+    seen_usernames = set()
+    seen_telegram = set()
+    for line, item in parsed:
+        if item.username in existing:
+            errors.append(_error(line, item.dict(), "Username already registered"))
+            continue
+        if item.username in seen_usernames:
+            errors.append(_error(line, item.dict(), "Duplicate username in file"))
+            continue
+        if item.telegram_id and (item.telegram_id in taken_telegram or item.telegram_id in seen_telegram):
+            errors.append(_error(line, item.dict(), "Telegram ID already linked to another user"))
+            continue
+        if item.team and item.team_id is None:
+            if item.team not in teams:
+                errors.append(_error(line, item.dict(), f"Unknown team: {item.team}"))
+                continue
+            item.team_id = teams[item.team]
+        if item.team_id is not None and item.team_id not in team_ids:
+            errors.append(_error(line, item.dict(), f"Unknown team_id: {item.team_id}"))
+            continue
+        seen_usernames.add(item.username)
+        if item.telegram_id:
+            seen_telegram.add(item.telegram_id)
+        valid.append((line, item))
+
+    errors.sort(key=lambda e: e["row"])
+    return valid, errors
+
+
+def _hashing_pool() -> ProcessPoolExecutor:
+    """One pool per process, created on first use and kept for later imports."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked: the API process has threads (uvicorn's threadpool, the bot's
+            # event loop and HTTP client, the SQLAlchemy pool) that a fork would copy mid-state
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.USER_IMPORT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _discard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """Hash in worker processes so the GIL-bound PBKDF2 rounds run on every core."""
+    workers = settings.USER_IMPORT_WORKERS
+    if len(passwords) < POOL_THRESHOLD or workers <= 1:
+        return [get_password_hash(p) for p in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    try:
+        return list(_hashing_pool().map(get_password_hash, passwords, chunksize=chunksize))
+    except (OSError, NotImplementedError, BrokenProcessPool) as e:
+        # Serverless runtimes such as Lambda have no /dev/shm for the pool's semaphores;
+        # a broken pool is dropped so the next import starts a fresh one
+        print(f"Password hashing pool unavailable, hashing serially: {e}")
+        _discard_pool()
+        return [get_password_hash(p) for p in passwords]
+
+
+def _mapping(item: ImportRow, password_hash: str) -> Dict:
+    return dict(
+        username=item.username,
+        password_hash=password_hash,
+        full_name=item.full_name,
+        role=item.role.value,
+        phone_number=item.phone_number,
+        email=item.email,
+        telegram_id=item.telegram_id,
+        team_id=item.team_id,
+        is_active=item.is_active
+    )
+
+
+def _insert_batch(db: Session, batch: List[Tuple[int, Dict]], errors: List[Dict]) -> int:
+    try:
+        db.bulk_insert_mappings(User, [m for _, m in batch])
+        db.commit()
+        return len(batch)
+    except IntegrityError:
+        db.rollback()
+
+    # Something raced us (e.g. the same username created meanwhile): retry row by row
+    created = 0
+    for line, mapping in batch:
+        try:
+            db.bulk_insert_mappings(User, [mapping])
+            db.commit()
+            created += 1
+        except IntegrityError as e:
+            db.rollback()
+            errors.append(_error(line, mapping, f"Insert failed: {e.orig}"))
+    return created
+
+
+def import_users(db: Session, rows: List[Dict], dry_run: bool = False, batch_size: int = INSERT_BATCH_SIZE) -> Dict:
+    """Validate, hash and insert. Returns counts and per-row errors."""
+    valid, errors = validate_rows(db, rows)
+    result = {"total": len(rows), "valid": len(valid), "created": 0, "dry_run": dry_run, "errors": errors}
+    if dry_run or not valid:
+        return result
+
+    hashes = hash_passwords([item.password for _, item in valid])
+    mappings = [(line, _mapping(item, h)) for (line, item), h in zip(valid, hashes)]
+    for i in range(0, len(mappings), batch_size):
+        result["created"] += _insert_batch(db, mappings[i:i + batch_size], errors)
+
+    errors.sort(key=lambda e: e["row"])
+    return result
@@ -0,0 +1,65 @@
+# Row-level visibility for jobs, shared by the API, reports and the bot.
+# A technician sees a job when an assignment names them or one of their teams. The rule is
+# applied as a correlated EXISTS on assignments (indexed on job_id, technician_id, team_id),
+# which avoids joining assignments and de-duplicating jobs with DISTINCT.
+from typing import List, Optional
+
+from sqlalchemy import exists, or_
+from sqlalchemy.orm import Session
+
+from app.core.cache import ResultCache, create_backend
+from app.core.config import settings
+from app.models.models import Assignment, Job, User, UserRole
+
+# user id -> team ids; cleared when users are edited
+team_cache = ResultCache(
+    "visibility",
+    ttl=settings.VISIBILITY_CACHE_TTL,
+    backend=create_backend(max_entries=settings.VISIBILITY_CACHE_SIZE)
+)
+
+
+def _role(user) -> str:
+    return str(user.role.value if hasattr(user.role, 'value') else user.role).lower()
+
+
+def is_restricted(user) -> bool:
+    """Technicians only see their assigned jobs; admins and staff see everything."""
+    return _role(user) == UserRole.TECHNICIAN.value
+
+
+def user_team_ids(db: Session, user_id: int) -> List[int]:
+    def compute():
+        team_id = db.query(User.team_id).filter(User.id == user_id).scalar()
+        return [team_id] if team_id else []
+    return team_cache.get_or_compute("teams", compute, params={"user_id": user_id})
+
+
+def invalidate_user(user_id: Optional[int] = None):
+    """Call after a user's team changes (or drop every entry with no id)."""
+    if user_id is None:
+        team_cache.invalidate("teams")
+    else:
+        team_cache.delete("teams", {"user_id": user_id})
+
+
+def assigned_clause(db: Session, user_id: int, job_id_column=Job.id):
+    """EXISTS clause: the job is assigned to the user directly or through one of their teams."""
+    team_ids = user_team_ids(db, user_id)
+    who = Assignment.technician_id == user_id
+    if team_ids:
+        who = or_(who, Assignment.team_id.in_(team_ids))
+    return exists().where(Assignment.job_id == job_id_column, who)
+
+
+def scope_jobs(query, db: Session, user, job_id_column=Job.id):
+    """Restrict any query over jobs (or rows keyed by job id) to what `user` may see."""
+    if is_restricted(user):
+        query = query.filter(assigned_clause(db, user.id, job_id_column))
+    return query
+
+
+def can_access_job(db: Session, user, job_id: int) -> bool:
+    if not is_restricted(user):
+        return True
+    return db.query(assigned_clause(db, user.id, job_id)).scalar()
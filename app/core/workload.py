@@ -0,0 +1,62 @@
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, distinct, func, literal_column, or_
+from sqlalchemy.orm import Session
+
+from app.models.models import Assignment, Job, JobStatus, User
+
+# Per technician, per day job load. Team assignments count for every member of the team,
+# so the numbers match what each technician actually sees in the bot.
+
+
+def _time_windows_agg(db: Session):
+    if db.bind.dialect.name == "postgresql":
+        return func.string_agg(distinct(Job.scheduled_time), literal_column("','"))
+    return func.group_concat(distinct(Job.scheduled_time))
+
+
+def assignee_join_condition():
+    """User matches an assignment directly, or through the team it was assigned to."""
+    return or_(
+        User.id == Assignment.technician_id,
+        and_(Assignment.technician_id.is_(None), Assignment.team_id.isnot(None), User.team_id == Assignment.team_id)
+    )
+
+
+def technician_day_loads(
+    db: Session,
+    start: date,
+    end: date,
+    team_id: Optional[int] = None,
+    user_ids: Optional[List[int]] = None
+) -> Dict[Tuple[int, date], Dict]:
+    """{(user_id, day): {"job_count", "time_windows"}} for scheduled, non-cancelled jobs in [start, end]."""
+    query = db.query(
+        User.id,
+        Job.scheduled_date,
+        func.count(distinct(Job.id)),
+        _time_windows_agg(db)
+    ).select_from(Assignment).join(
+        Job, Job.id == Assignment.job_id
+    ).join(
+        User, assignee_join_condition()
+    ).filter(
+        Job.scheduled_date >= start,
+        Job.scheduled_date <= end,
+        Job.status != JobStatus.CANCELLED
+    )
+    if team_id is not None:
+        query = query.filter(User.team_id == team_id)
+    if user_ids is not None:
+        query = query.filter(User.id.in_(user_ids))
+
+    loads = {}
+    for user_id, day, count, windows in query.group_by(User.id, Job.scheduled_date).all():
+        if not isinstance(day, date):
+            day = date.fromisoformat(str(day)[:10])
+        loads[(user_id, day)] = {
+            "job_count": count,
+            "time_windows": sorted(w for w in (windows or "").split(",") if w)
+        }
+    return loads
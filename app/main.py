@@ -49,11 +49,37 @@ async def seed_db():
     except Exception as e:
         return {"error": str(e), "status": "failed"}
 
+# Indexes on existing tables (create_all only creates indexes for new tables)
+INDEX_MIGRATIONS = [
+    "CREATE INDEX IF NOT EXISTS ix_jobs_project_id ON jobs (project_id)",
+    "CREATE INDEX IF NOT EXISTS ix_users_team_id ON users (team_id)",
+    "CREATE INDEX IF NOT EXISTS ix_assignments_job_id ON assignments (job_id)",
+    "CREATE INDEX IF NOT EXISTS ix_assignments_technician_id ON assignments (technician_id)",
+    "CREATE INDEX IF NOT EXISTS ix_assignments_team_id ON assignments (team_id)",
+    "CREATE INDEX IF NOT EXISTS ix_users_role ON users (role)",
+    "CREATE INDEX IF NOT EXISTS ix_users_telegram_id ON users (telegram_id)",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_scheduled_date ON jobs (scheduled_date)",
+    "CREATE INDEX IF NOT EXISTS ix_users_full_name ON users (full_name)",
+    # Postgres only: trigram indexes so ILIKE '%term%' user search can use an index
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_full_name_trgm ON users USING gin (full_name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users USING gin (username gin_trgm_ops)",
+]
+
 @app.get("/setup/migrate")
 async def migrate_db():
     """Manual trigger to migrate database for Vercel (Add Cols/Tables)"""
     try:
         from sqlalchemy import text
+        # Autocommit so one failing statement doesn't abort the others
+        with engine.connect() as conn:
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            for statement in INDEX_MIGRATIONS:
+                try:
+                    conn.execute(text(statement))
+                except Exception as e:
+                    print(f"Index migration skipped ({statement}): {e}")
+
         with engine.connect() as conn:
             # 1. Create JobHistory table (Postgres/SQLite compatible-ish)
             # Note: For SQLite 'SERIAL' might fail, using AUTOINCREMENT or just INTEGER PRIMARY KEY is better for universal
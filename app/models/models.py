@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum, Boolean, Date
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Text, Enum, Boolean, Date, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -21,6 +21,12 @@ class JobStatus(str, enum.Enum):
     COMPLETED = "completed"
     CANCELLED = "cancelled"
 
+class ExportStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
 
 class Team(Base):
     __tablename__ = "teams"
@@ -51,13 +57,13 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True)
     password_hash = Column(String)
-    full_name = Column(String)
-    role = Column(String, default=UserRole.TECHNICIAN)
+    full_name = Column(String, index=True)
+    role = Column(String, default=UserRole.TECHNICIAN, index=True)
     
     # New Team Field
-    team_id = Column(Integer, ForeignKey("teams.id"), nullable=True)
+    team_id = Column(Integer, ForeignKey("teams.id"), nullable=True, index=True)
     
-    telegram_id = Column(String, nullable=True)
+    telegram_id = Column(String, nullable=True, index=True)
     phone_number = Column(String, nullable=True)
     email = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
@@ -75,7 +81,7 @@ class Job(Base):
     status = Column(String, default=JobStatus.PENDING)
     
     # Optional Project Link
-    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True, index=True)
     
     customer_name = Column(String)
     customer_phone = Column(String)
@@ -89,7 +95,7 @@ class Job(Base):
     location_lat = Column(String, nullable=True)
     location_long = Column(String, nullable=True)
     
-    scheduled_date = Column(Date)
+    scheduled_date = Column(Date, index=True)
     scheduled_time = Column(String, nullable=True) # e.g. "14:00" or "Morning"
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -98,6 +104,7 @@ class Job(Base):
     project = relationship("Project", back_populates="jobs")
     assignments = relationship("Assignment", back_populates="job")
     history_logs = relationship("JobHistory", back_populates="job", cascade="all, delete-orphan")
+    status_durations = relationship("JobStatusDuration", cascade="all, delete-orphan")
 
 class JobHistory(Base):
     __tablename__ = "job_history"
@@ -115,15 +122,28 @@ class JobHistory(Base):
     job = relationship("Job", back_populates="history_logs")
     user = relationship("User")
 
+# Materialized time-in-status segments, derived from JobHistory transitions
+class JobStatusDuration(Base):
+    __tablename__ = "job_status_durations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("jobs.id"), index=True)
+    history_id = Column(Integer, nullable=True, index=True) # job_history.id that entered the status (None = job creation)
+    status = Column(String, index=True)
+
+    entered_at = Column(DateTime(timezone=True))
+    left_at = Column(DateTime(timezone=True), nullable=True) # None = current status
+    duration_seconds = Column(Integer, nullable=True)
+
 class Assignment(Base):
     __tablename__ = "assignments"
 
     id = Column(Integer, primary_key=True, index=True)
-    job_id = Column(Integer, ForeignKey("jobs.id"))
+    job_id = Column(Integer, ForeignKey("jobs.id"), index=True)
     
     # Polymorphic-like assignment: Either Tech OR Team
-    technician_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    team_id = Column(Integer, ForeignKey("teams.id"), nullable=True)
+    technician_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    team_id = Column(Integer, ForeignKey("teams.id"), nullable=True, index=True)
     
     assigned_at = Column(DateTime(timezone=True), server_default=func.now())
     
@@ -137,3 +157,84 @@ class Assignment(Base):
     technician = relationship("User", back_populates="assignments")
     team = relationship("Team", back_populates="assignments")
 
+
+class UpdateStatus(str, enum.Enum):
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+# Telegram webhook updates: the primary key makes Telegram's retries idempotent,
+# the payload lets a restarted instance finish what was queued.
+class TelegramUpdate(Base):
+    __tablename__ = "telegram_updates"
+
+    update_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    chat_id = Column(String, nullable=True)
+    payload = Column(Text, nullable=True) # JSON encoded update, cleared once it has been processed
+    status = Column(String, default=UpdateStatus.QUEUED, index=True)
+    error = Column(Text, nullable=True)
+
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    started_at = Column(DateTime(timezone=True), nullable=True) # when the current attempt claimed it
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+# Bot state shared by every instance: chat_data, user_data and conversation states
+# (namespace "chat_data", "user_data", "conversation:<name>"), plus the cached getMe result
+class BotState(Base):
+    __tablename__ = "bot_state"
+
+    namespace = Column(String, primary_key=True)
+    key = Column(String, primary_key=True) # chat/user id, or JSON list for conversation keys
+    data = Column(Text) # JSON encoded
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class DeliveryStatus(str, enum.Enum):
+    PENDING = "pending"
+    SENDING = "sending" # claimed by a running digest
+    SENT = "sent"
+    FAILED = "failed"
+    BLOCKED = "blocked" # the user blocked the bot or the chat is gone
+
+# One row per technician and day of the morning digest; re-running the digest skips sent rows
+class DigestDelivery(Base):
+    __tablename__ = "digest_deliveries"
+    __table_args__ = (UniqueConstraint("day", "user_id", name="uq_digest_day_user"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    chat_id = Column(String)
+    job_count = Column(Integer, default=0)
+    status = Column(String, default=DeliveryStatus.PENDING, index=True)
+    attempts = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    claim_id = Column(String, nullable=True) # run that is sending it
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    user = relationship("User")
+
+class ExportJob(Base):
+    __tablename__ = "export_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String) # e.g. "jobs_csv", "overdue_csv"
+    params = Column(Text, nullable=True) # JSON encoded
+    status = Column(String, default=ExportStatus.QUEUED, index=True)
+
+    progress = Column(Integer, default=0) # rows written
+    total = Column(Integer, nullable=True) # rows expected, if known
+    file_path = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    worker_id = Column(String, nullable=True) # host:pid of the instance running it
+
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    user = relationship("User")
@@ -1,4 +1,3 @@
-import asyncio
 import logging
 from app.core.telegram_bot import create_app
 
@@ -18,15 +17,11 @@ def main():
     print("Starting Telegram Bot (Polling Mode)...")
     print("Press Ctrl+C to stop.")
     
-    # Ensure any existing webhook (from Vercel) is removed before Polling
-    # This specifically addresses the user's question about local testing.
-    print("- Cleaning up webhooks...")
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(application.bot.delete_webhook(drop_pending_updates=True))
-    
+    # Any existing webhook (from Vercel) is removed when polling starts (drop_pending_updates
+    # deletes it the same way delete_webhook did); see serve.py to run the bot with the API.
     # Run the bot until the user presses Ctrl-C
     # application.run_polling() is blocking and handles the event loop internally
-    application.run_polling()
+    application.run_polling(drop_pending_updates=True)
 
 if __name__ == "__main__":
     try:
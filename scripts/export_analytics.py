@@ -0,0 +1,56 @@
+import sys
+import os
+import json
+import argparse
+from datetime import datetime
+
+# Add project root to python path
+sys.path.append(os.getcwd())
+
+from app.core.database import SessionLocal
+from app.core.analytics_export import export_tables, TABLES
+
+STATE_FILE = "state.json"
+
+def main():
+    parser = argparse.ArgumentParser(description="Export jobs, assignments and job_history as Parquet/Arrow files.")
+    parser.add_argument("--out", default="analytics_export", help="Output directory")
+    parser.add_argument("--format", default="parquet", choices=["parquet", "arrow"])
+    parser.add_argument("--tables", nargs="*", default=list(TABLES), choices=list(TABLES))
+    parser.add_argument("--since", help="Only rows created/updated after this ISO timestamp")
+    parser.add_argument("--incremental", action="store_true", help="Continue from the watermark of the previous run")
+    args = parser.parse_args()
+
+    state_path = os.path.join(args.out, STATE_FILE)
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+
+    since = None
+    if args.since:
+        since = datetime.fromisoformat(args.since)
+    elif args.incremental and state.get("watermark"):
+        since = datetime.fromisoformat(state["watermark"])
+
+    run_dir = os.path.join(args.out, datetime.utcnow().strftime("%Y%m%dT%H%M%S"))
+    db = SessionLocal()
+    try:
+        manifest = export_tables(db, run_dir, tables=args.tables, fmt=args.format, since=since)
+    finally:
+        db.close()
+
+    for name, info in manifest["tables"].items():
+        print(f"{name}: {info['rows']} rows -> {os.path.join(run_dir, info['file'])}")
+
+    # Next incremental run starts from the oldest table watermark, so no table misses rows
+    watermarks = [t["watermark"] for t in manifest["tables"].values() if t["watermark"]]
+    if watermarks:
+        state["watermark"] = min(watermarks)
+        state["last_run"] = run_dir
+        with open(state_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        print(f"Watermark saved: {state['watermark']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import sys
+import os
+import json
+import argparse
+
+# Add project root to python path
+sys.path.append(os.getcwd())
+
+from app.core.database import SessionLocal
+from app.core.user_import import parse_rows, import_users
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import users from a CSV or JSON file")
+    parser.add_argument("path", help="CSV or JSON file")
+    parser.add_argument("--format", choices=["csv", "json"], help="Defaults to the file extension")
+    parser.add_argument("--dry-run", action="store_true", help="Validate only, do not create users")
+    args = parser.parse_args()
+
+    fmt = args.format or ("json" if args.path.lower().endswith(".json") else "csv")
+    with open(args.path, "rb") as f:
+        rows = parse_rows(f.read(), fmt)
+
+    db = SessionLocal()
+    try:
+        result = import_users(db, rows, dry_run=args.dry_run)
+    finally:
+        db.close()
+
+    for error in result["errors"]:
+        print(f"Data row {error['row']} ({error['username']}): {error['error']}")
+    print(json.dumps({k: v for k, v in result.items() if k != "errors"}))
+    if result["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import sys
+import os
+import time
+
+# Add project root to python path
+sys.path.append(os.getcwd())
+
+# Importing the API registers the exporters (jobs_csv, overdue_csv, ...)
+import app.api.api  # noqa: F401
+from app.core.database import Base, engine
+from app.core.export_jobs import run_pending_exports
+
+POLL_SECONDS = 5
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    print("Export worker started. Press Ctrl+C to stop.")
+    while True:
+        processed = run_pending_exports()
+        if processed:
+            print(f"Processed {processed} export(s).")
+        else:
+            time.sleep(POLL_SECONDS)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Export worker stopped.")
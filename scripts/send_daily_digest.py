@@ -0,0 +1,31 @@
+import sys
+import os
+import asyncio
+import argparse
+from datetime import date
+
+# Add project root to python path
+sys.path.append(os.getcwd())
+
+from app.core.config import settings
+from app.core.database import Base, engine
+from app.core.digest import digest_loop, send_daily_digest
+
+def main():
+    parser = argparse.ArgumentParser(description="Send the technicians' morning digest on Telegram.")
+    parser.add_argument("--now", action="store_true", help="Send once and exit instead of waiting for BOT_DIGEST_TIME")
+    parser.add_argument("--day", type=date.fromisoformat, help="Day to send (YYYY-MM-DD), with --now")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    if args.now:
+        asyncio.run(send_daily_digest(args.day))
+        return
+    print(f"Digest scheduler started, sending daily at {settings.BOT_DIGEST_TIME}. Press Ctrl+C to stop.")
+    asyncio.run(digest_loop())
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Digest scheduler stopped.")
@@ -0,0 +1,174 @@
+import os
+import sys
+import asyncio
+import argparse
+import contextlib
+import logging
+import multiprocessing
+import signal
+
+# One connection pool per worker, shared by the API, the bot and the scheduler
+os.environ.setdefault("DB_POOL_SIZE", "10")
+
+import uvicorn
+
+from app.core.config import settings
+
+# Enable logging
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+logger = logging.getLogger("serve")
+
+EXPORT_POLL_SECONDS = 5
+SHUTDOWN_GRACE_SECONDS = 10 # for queued webhook updates to finish
+
+
+class _Server(uvicorn.Server):
+    @contextlib.contextmanager
+    def capture_signals(self):
+        # The supervisor owns SIGINT/SIGTERM and shuts every component down, the API included
+        yield
+
+
+async def _every(seconds: float, func, name: str):
+    """Run a blocking function in a thread every `seconds`, until cancelled."""
+    while True:
+        try:
+            await asyncio.to_thread(func)
+        except Exception as e:
+            print(f"Scheduled task {name} failed: {e}")
+        await asyncio.sleep(seconds)
+
+
+def start_scheduler(bot_mode: str):
+    """Periodic tasks; they run in the first worker only."""
+    from app.core.digest import digest_loop
+    from app.core.export_jobs import run_pending_exports
+    import app.api.api  # noqa: F401  (registers the exporters)
+
+    tasks = [asyncio.create_task(_every(EXPORT_POLL_SECONDS, run_pending_exports, "exports"))]
+    if bot_mode != "off":
+        tasks.append(asyncio.create_task(digest_loop()))
+    return tasks
+
+
+async def start_bot(mode: str, primary: bool):
+    """Polling runs in the first worker only; in webhook mode every worker answers the endpoint."""
+    if mode == "polling" and primary:
+        from app.core.telegram_bot import create_app
+        application = create_app()
+        if not application:
+            return None
+        await application.initialize()
+        await application.start()
+        # Also removes a webhook left over from a serverless deployment
+        await application.updater.start_polling(drop_pending_updates=True)
+        logger.info("Telegram bot polling")
+        return application
+    if mode == "webhook":
+        from app.api.endpoints.bot import get_bot_app
+        application = await get_bot_app()
+        if application:
+            logger.info("Telegram bot ready for webhook updates")
+        return application
+    return None
+
+
+async def stop_bot(application, mode: str):
+    if not application:
+        return
+    if mode == "polling":
+        await application.updater.stop()
+        await application.stop()
+    else:
+        from app.core.bot_queue import update_queue
+        try:
+            await asyncio.wait_for(update_queue.join(), SHUTDOWN_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning("%s Telegram updates left queued; they are retried on the next start", update_queue.size())
+    await application.shutdown()
+
+
+async def run_worker(index: int, options: dict, sockets=None):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    primary = index == 0
+    server = _Server(uvicorn.Config(
+        "app.main:app", host=options["host"], port=options["port"], log_level="info"
+    ))
+    api = asyncio.create_task(server.serve(sockets=sockets))
+    # The bot and the scheduler need the tables created by the API's startup event
+    while not server.started and not api.done():
+        await asyncio.sleep(0.05)
+
+    bot = None
+    scheduled = []
+    if not api.done():
+        bot = await start_bot(options["bot_mode"], primary)
+        if primary:
+            scheduled = start_scheduler(options["bot_mode"])
+        logger.info("Worker %s ready (bot: %s, scheduler: %s)", index, options["bot_mode"], "on" if primary else "off")
+        waiter = asyncio.create_task(stop.wait())
+        await asyncio.wait([api, waiter], return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+
+    # Stop taking updates first, then scheduled work, then drain the API
+    logger.info("Worker %s shutting down", index)
+    await stop_bot(bot, options["bot_mode"])
+    for task in scheduled:
+        task.cancel()
+    await asyncio.gather(*scheduled, return_exceptions=True)
+    server.should_exit = True
+    await api
+
+    from app.core.database import engine
+    engine.dispose()
+
+
+def _worker_main(index: int, options: dict, sockets):
+    asyncio.run(run_worker(index, options, sockets))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API, the Telegram bot and scheduled tasks together.")
+    parser.add_argument("--host", default=settings.SERVE_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVE_WORKERS, help="API processes (e.g. one per core)")
+    parser.add_argument("--bot", dest="bot_mode", choices=["polling", "webhook", "off"], default=settings.BOT_MODE)
+    args = parser.parse_args()
+    options = {"host": args.host, "port": args.port, "bot_mode": args.bot_mode}
+
+    if args.workers <= 1:
+        asyncio.run(run_worker(0, options))
+        return
+
+    # Workers share one listening socket; each has its own loop, pool and caches.
+    # With CACHE_BACKEND=redis the result caches (reports, bot users, project names) are shared,
+    # so an invalidation in any worker reaches the polling bot in worker 0. Counters such as
+    # /api/reports/intents (rule hit rate, AI latency) stay per worker.
+    sock = uvicorn.Config("app.main:app", host=args.host, port=args.port).bind_socket()
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_worker_main, args=(index, options, [sock]), name=f"worker-{index}")
+        for index in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def forward(sig, frame):
+        for worker in workers:
+            if worker.is_alive() and worker.pid:
+                os.kill(worker.pid, sig)
+
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+    for worker in workers:
+        worker.join()
+    sock.close()
+
+if __name__ == "__main__":
+    sys.exit(main())